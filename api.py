@@ -1,5 +1,56 @@
-from config import api_server_url
+from config import (api_server_url, api_pool_size,
+                    api_connect_timeout, api_read_timeout,
+                    identity_cache_size, identity_cache_ttl,
+                    api_fanout_workers,
+                    validation_cache_size, validation_cache_ttl,
+                    response_max_age,
+                    snapshot_enabled, snapshot_path, snapshot_max_age, snapshot_fallback_timeout,
+                    snapshot_access_ttl)
+from cache import create_cache
+from snapshot import SnapshotStore
+from metrics import observe_api_call
+import circuit
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger("lingo.api")
+
+# All calls to the API server go through one requests.Session per worker
+# process, so connections (and TLS sessions) are pooled and kept alive
+# between callbacks instead of being set up again for every request.
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+# Independent requests made for a single callback are run side by side
+# on this pool, which is also created per worker process
+_executor = None
+_executor_pid = None
+
+api_timeout = (api_connect_timeout, api_read_timeout)
+
+# Who the user is, which team they are on, and whether they own it almost
+# never change during a session, so these lookups are cached per token
+_identity_cache = create_cache("identity", identity_cache_size, identity_cache_ttl)
+
+# The last copy of each word, meaning, and reflection list we were sent, with
+# its ETag and Last-Modified validators and when it was fetched, per endpoint
+# and token
+_validation_cache = create_cache("validation", validation_cache_size, validation_cache_ttl)
+
+# The optional local copy of every list, used when the API server is slow or down
+_snapshot = SnapshotStore(snapshot_path, snapshot_access_ttl) if snapshot_enabled else None
+
+# When each list being shown from an earlier copy, because the API server
+# couldn't give it to us, was saved, per endpoint and token
+_stale = create_cache("stale", validation_cache_size, validation_cache_ttl)
 
 
 def configure_headers(api_token):
@@ -15,93 +66,278 @@ def configure_headers_with_body(api_token):
     return headers
 
 
-# TODO: Add the current team ID as an input
-def fetch_words(api_token, team_id):
+def _get_session():
+    global _session, _session_pid
+    # The session is created lazily, and again if we find ourselves in a new
+    # process, so gunicorn workers never share sockets with the master.
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=api_pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+                _session_pid = pid
+    return _session
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _session_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=api_fanout_workers,
+                                               thread_name_prefix="lingo-api")
+                _executor_pid = pid
+    return _executor
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# GET requests currently being made by this worker, keyed by endpoint and token
+# scope. A second caller asking for the same thing while the first
+# request is still in flight waits for that request instead of making its own.
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def _single_flight(key, fn):
+    with _in_flight_lock:
+        call = _in_flight.get(key)
+        is_leader = call is None
+        if is_leader:
+            call = _Call()
+            _in_flight[key] = call
+
+    if not is_leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = fn()
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+        call.done.set()
+    return call.result
+
+
+def _get(path, api_token):
+    return _single_flight(_cache_key(path, api_token), lambda: _send_get(path, api_token))
+
+
+def _send_get(path, api_token, extra_headers=None, timeout=None):
+    if not circuit.allow("GET", path):
+        return None
     headers = configure_headers(api_token)
-    # TODO: Use the /teams/{team_id}/words endpoint instead to just get the words for the team
-    full_endpoint = f"{api_server_url}/api/teams/{team_id}/words"
-    response = requests.get(full_endpoint, headers=headers)
+    if extra_headers:
+        headers.update(extra_headers)
+    started = time.perf_counter()
+    response = None
+    try:
+        response = _get_session().get(f"{api_server_url}{path}", headers=headers, timeout=timeout or api_timeout)
+        return response
+    except requests.RequestException as e:
+        logger.warning("Request to %s failed: %s", path, e)
+        return None
+    finally:
+        circuit.record("GET", path, response, time.perf_counter() - started)
+        observe_api_call("GET", path, started, response)
+
+
+def _get_revalidated(path, api_token, description, revalidate=False):
+    # Lists of words, meanings, and reflections are kept along with their
+    # validators, so later requests can be made conditional. A list fetched
+    # within the last response_max_age seconds is used without asking at
+    # all, unless the caller is checking for changes. When the API server
+    # answers 304 Not Modified we reuse the list we already parsed. If it
+    # fails, or its circuit is open, the last list we have is shown instead.
+    cache_key = _cache_key(path, api_token)
+    scope = token_scope(api_token)
+
+    def load():
+        cached = _validation_cache.get(cache_key)
+        conditional_headers = {}
+        if cached is not None:
+            if not revalidate and time.time() - cached.get("fetched_at", 0) < response_max_age:
+                _stale.delete(cache_key)
+                return cached["data"]
+            if cached["etag"]:
+                conditional_headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                conditional_headers["If-Modified-Since"] = cached["last_modified"]
+
+        # With a snapshot of the list to fall back on, we don't wait long for
+        # the API server, and a recent enough snapshot is used as it is
+        snapshot = _snapshot.read(path, scope) if _snapshot is not None else None
+        timeout = api_timeout
+        if snapshot is not None:
+            items, refreshed_at, expired = snapshot
+            if not revalidate and not expired and time.time() - refreshed_at < snapshot_max_age:
+                _stale.delete(cache_key)
+                return items
+            timeout = (api_connect_timeout, min(api_read_timeout, snapshot_fallback_timeout))
+
+        response = _send_get(path, api_token, conditional_headers, timeout)
+        if response is not None and response.status_code == 304 and cached is not None:
+            _validation_cache.set(cache_key, dict(cached, fetched_at=time.time()))
+            if _snapshot is not None:
+                _snapshot.store(path, scope, cached["data"])
+            _stale.delete(cache_key)
+            return cached["data"]
+        if response is not None and response.status_code == 200:
+            try:
+                data = response.json()
+            except Exception as e:
+                logger.error("Error processing %s data: %s", description, e)
+                return None
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified or response_max_age > 0:
+                _validation_cache.set(cache_key, {"etag": etag, "last_modified": last_modified,
+                                                  "fetched_at": time.time(), "data": data})
+            if _snapshot is not None:
+                _snapshot.store(path, scope, data)
+            _stale.delete(cache_key)
+            return data
 
-    # print("Status Code:", response.status_code)  # Debugging line to check the status code
-    # print("Response Text:", response.text)  # Debugging line to check the raw response text
+        logger.warning("Failed to fetch %s data, Status Code: %s", description, _status_code(response))
+        if _status_code(response) in (401, 403, 404):
+            # The API server says this user can't have the list (any more)
+            _stale.delete(cache_key)
+            if _snapshot is not None:
+                _snapshot.revoke(path, scope)
+            return None
+        # Fall back on the newer of the cached list and the snapshot
+        saved = []
+        if cached is not None:
+            saved.append((cached["fetched_at"], cached["data"]))
+        if snapshot is not None:
+            saved.append((snapshot[1], snapshot[0]))
+        if not saved:
+            return None
+        saved_at, data = max(saved, key=lambda entry: entry[0])
+        _stale.set(cache_key, saved_at)
+        return data
 
-    if response.status_code == 200:
-        try:
-            ids = []
-            words = []
+    return _single_flight(cache_key, load)
 
-            data = response.json()
-            return data
-            # print("Data received:", data)
-            #
-            # for w in data:
-            #     ids.append(w["id"])
-            #     words.append(w["word"])
-            #
-            # df = pd.DataFrame({
-            #     "Id": ids,
-            #     "Word": words
-            # })
-            #
-            # print("DataFrame:", df)  # Debugging line to see the DataFrame structure
-            # return df
-        except Exception as e:
-            print("Error processing data:", e)  # Print any error during data processing
-            return None
-    else:
-        return None
 
-def fetch_reflections(word_id, api_token):
-    headers = configure_headers(api_token)
-    full_endpoint = f"{api_server_url}/api/words/{word_id}/reflections"
-    response = requests.get(full_endpoint, headers=headers)
+def _never_sent(error):
+    # The connection couldn't be made, so the API server never saw the request
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
 
-    # print("Status Code:", response.status_code)  # Debugging line to check the status code
-    # print("Response Text:", response.text)  # Debugging line to check the raw response text
 
-    if response.status_code == 200:
-        try:
-            reflections_data = response.json()
-            # print("Reflections Data Received:", reflections_data)  # Debugging line to check what data is received
-            return reflections_data
-        except Exception as e:
-            print("Error processing reflections data:", e)  # Print any error during data processing
+def _post(path, api_token, data, retries=0):
+    # POSTs add things, so they are only tried again (up to retries more
+    # times) when the request never reached the API server. After a read
+    # timeout or a dropped connection it may already have been added.
+    headers = configure_headers_with_body(api_token)
+    for attempt in range(retries + 1):
+        if not circuit.allow("POST", path):
             return None
-    else:
-        print("Failed to fetch reflections data, please try refreshing your browser.")
-        return None
+        started = time.perf_counter()
+        response = None
+        try:
+            response = _get_session().post(f"{api_server_url}{path}", json=data, headers=headers,
+                                           timeout=api_timeout)
+            return response
+        except requests.RequestException as e:
+            logger.warning("Request to %s failed: %s", path, e)
+            if not _never_sent(e) or attempt == retries:
+                return None
+        finally:
+            circuit.record("POST", path, response, time.perf_counter() - started)
+            observe_api_call("POST", path, started, response)
+        time.sleep(0.5 * 2 ** attempt)
 
 
-def fetch_meanings(word_id, api_token):
-    headers = configure_headers(api_token)
-    full_endpoint = f"{api_server_url}/api/words/{word_id}/meanings"
-    response = requests.get(full_endpoint, headers=headers)
+def token_scope(api_token):
+    # Tokens are long, so cache keys use a digest of the token instead
+    if not api_token:
+        return ""
+    return hashlib.sha256(api_token.encode()).hexdigest()
 
-    # print("Status Code:", response.status_code)  # Debugging line to check the status code
-    # print("Response Text:", response.text)  # Debugging line to check the raw response text
 
-    if response.status_code == 200:
-        try:
-            meanings_data = response.json()
-            # print("Meanings Data Received:", meanings_data)  # Debugging line to check what data is received
-            return meanings_data
-        except Exception as e:
-            print("Error processing meanings data:", e)  # Print any error during data processing
-            return None
-    else:
-        print("Failed to fetch meanings data, please try refreshing your browser.")
-        return None
+def _cache_key(path, api_token):
+    return f"{path}|{token_scope(api_token)}"
+
+
+def invalidate_path(path):
+    # Forget a cached list for every user, not just the one who changed it.
+    # With the shared cache backend this also reaches the other workers.
+    _validation_cache.delete_prefix(f"{path}|")
+    _stale.delete_prefix(f"{path}|")
+    if _snapshot is not None:
+        _snapshot.forget(path)
+
+
+def _stale_since(api_token, *paths):
+    # When the oldest of these lists was saved, if any of them is being shown
+    # to this user from an earlier copy because the API server couldn't give
+    # it to us
+    stamps = [stamp for stamp in (_stale.get(_cache_key(path, api_token)) for path in paths)
+              if stamp is not None]
+    return min(stamps) if stamps else None
+
+
+def words_stale_since(api_token, team_id):
+    return _stale_since(api_token, f"/api/teams/{team_id}/words")
+
+
+def word_details_stale_since(api_token, word_id):
+    return _stale_since(api_token, f"/api/words/{word_id}/meanings", f"/api/words/{word_id}/reflections")
+
+
+def _status_code(response):
+    return response.status_code if response is not None else None
+
+
+# TODO: Add the current team ID as an input
+def fetch_words(api_token, team_id, revalidate=False):
+    return _get_revalidated(f"/api/teams/{team_id}/words", api_token, "words", revalidate)
+
+
+def fetch_reflections(word_id, api_token, revalidate=False):
+    return _get_revalidated(f"/api/words/{word_id}/reflections", api_token, "reflections", revalidate)
+
+
+def fetch_meanings(word_id, api_token, revalidate=False):
+    return _get_revalidated(f"/api/words/{word_id}/meanings", api_token, "meanings", revalidate)
+
+
+def fetch_word_details(word_id, api_token, revalidate=False):
+    # Ask for the meanings and the reflections at the same time, so loading
+    # a word takes as long as the slower of the two rather than both added up
+    executor = _get_executor()
+    meanings_future = executor.submit(fetch_meanings, word_id, api_token, revalidate)
+    reflections_future = executor.submit(fetch_reflections, word_id, api_token, revalidate)
+    return meanings_future.result(), reflections_future.result()
 
 
 def fetch_user_teams(api_token, logger):
-    headers = configure_headers(api_token)
-    full_endpoint = f"{api_server_url}/api/my/teams"
-    response = requests.get(full_endpoint, headers=headers)
+    response = _get("/api/my/teams", api_token)
 
     # print("Status Code:", response.status_code)  # Debugging line to check the status code
     # print("Response Text:", response.text)  # Debugging line to check the raw response text
 
-    if response.status_code == 200:
+    if response is not None and response.status_code == 200:
         try:
             user_team_list = response.json()
             return user_team_list
@@ -109,120 +345,166 @@ def fetch_user_teams(api_token, logger):
             logger.error("Error processing user teams data:", e)
             return None
     else:
-        logger.debug(f"Failed to fetch user team data, Status Code: {response.status_code}")
+        logger.debug(f"Failed to fetch user team data, Status Code: {_status_code(response)}")
         return None
 
 
 def fetch_user_info(api_token):
-    headers = configure_headers(api_token)
-    full_endpoint = f"{api_server_url}/api/my/userinfo"
-    response = requests.get(full_endpoint, headers=headers)
+    if not api_token:
+        return None
+    cache_key = _cache_key("/api/my/userinfo", api_token)
+    data = _identity_cache.get(cache_key)
+    if data is not None:
+        return data
+
+    response = _get("/api/my/userinfo", api_token)
 
     # print("Status Code:", response.status_code)  # Debugging line to check the status code
     # print("Response Text:", response.text)  # Debugging line to check the raw response text
 
-    if response.status_code == 200:
+    if response is not None and response.status_code == 200:
         try:
             data = response.json()
+            _identity_cache.set(cache_key, data)
             return data
         except Exception as e:
-            print("Error processing data:", e)  # Print any error during data processing
+            logger.error("Error processing data: %s", e)
             return None
     else:
         return None
 
 
 def fetch_team(api_token, team_id):
-    headers = configure_headers(api_token)
-    full_endpoint = f"{api_server_url}/api/teams/{team_id}"
-    response = requests.get(full_endpoint, headers=headers)
+    if not api_token:
+        return None
+    cache_key = _cache_key(f"/api/teams/{team_id}", api_token)
+    data = _identity_cache.get(cache_key)
+    if data is not None:
+        return data
+
+    response = _get(f"/api/teams/{team_id}", api_token)
 
     # print("Status Code:", response.status_code)  # Debugging line to check the status code
     # print("Response Text:", response.text)  # Debugging line to check the raw response text
 
-    if response.status_code == 200:
+    if response is not None and response.status_code == 200:
         try:
             data = response.json()
+            _identity_cache.set(cache_key, data)
             return data
         except Exception as e:
-            print("Error processing data:", e)  # Print any error during data processing
+            logger.error("Error processing data: %s", e)
             return None
     else:
         return None
 
 
-def create_word(api_token, team_id, word):
-    headers = configure_headers_with_body(api_token)
+def create_word(api_token, team_id, word, retries=0):
     data = {
         "team_id": team_id,
         "word": word,
     }
-    response = requests.post(f"{api_server_url}/api/words", json=data, headers=headers)
+    response = _post("/api/words", api_token, data, retries)
+    if response is not None and response.ok:
+        invalidate_path(f"/api/teams/{team_id}/words")
     return response
 
 
-def create_meaning(api_token, word_id, meaning):
-    headers = configure_headers_with_body(api_token)
+def create_meaning(api_token, word_id, meaning, retries=0):
     data = {
         "meaning": meaning,
     }
-    response = requests.post(f"{api_server_url}/api/words/{word_id}/meanings", json=data, headers=headers)
+    response = _post(f"/api/words/{word_id}/meanings", api_token, data, retries)
+    if response is not None and response.ok:
+        invalidate_path(f"/api/words/{word_id}/meanings")
     return response
 
 
-def create_reflection(api_token, word_id, reflection):
-    headers = configure_headers_with_body(api_token)
+def create_reflection(api_token, word_id, reflection, retries=0):
     data = {
         "reflection": reflection,
     }
-    response = requests.post(f"{api_server_url}/api/words/{word_id}/reflections", json=data, headers=headers)
+    response = _post(f"/api/words/{word_id}/reflections", api_token, data, retries)
+    if response is not None and response.ok:
+        invalidate_path(f"/api/words/{word_id}/reflections")
     return response
 
 def update_user_with_current_team(api_token, new_team_id):
-    headers = configure_headers_with_body(api_token)
     data = {
         "current_team_id": new_team_id,
     }
-    response = requests.post(f"{api_server_url}/api/my/teams", json=data, headers=headers)
+    response = _post("/api/my/teams", api_token, data)
+    # Changing teams changes both the user info and the team membership, so
+    # drop what we have cached for this user whether or not the call worked
+    if api_token:
+        _identity_cache.delete(_cache_key("/api/my/userinfo", api_token))
+        _identity_cache.delete(_cache_key("/api/my/team-membership", api_token))
     return response
 
 
 # TODO: Call the /my/team-membership endpoint, get back values
 def fetch_team_members(api_token, current_team_id):
-    headers = configure_headers(api_token)
-    full_endpoint = f"{api_server_url}/api/teams/{current_team_id}/users"
-    response = requests.get(full_endpoint, headers=headers)
+    return _get_revalidated(f"/api/teams/{current_team_id}/users", api_token, "team members")
+
+
+def is_owner(api_token):
+    if not api_token:
+        return None
+    cache_key = _cache_key("/api/my/team-membership", api_token)
+    owner = _identity_cache.get(cache_key)
+    if owner is not None:
+        return owner
+
+    response = _get("/api/my/team-membership", api_token)
 
     # print("Status Code:", response.status_code)  # Debugging line to check the status code
     # print("Response Text:", response.text)  # Debugging line to check the raw response text
 
-    if response.status_code == 200:
+    if response is not None and response.status_code == 200:
         try:
-            team_member_list = response.json()
-            return team_member_list
+            owner = response.json()['is_owner']
+            _identity_cache.set(cache_key, owner)
+            return owner
         except Exception as e:
-            print("Error processing team member data:", e)
+            logger.error("Error processing team member data: %s", e)
             return None
     else:
-        print(f"Failed to fetch team members data, Status Code: {response.status_code}")
+        logger.warning("Failed to fetch team members data, Status Code: %s", _status_code(response))
         return None
 
 
-def is_owner(api_token):
-    headers = configure_headers(api_token)
-    full_endpoint = f"{api_server_url}/api/my/team-membership"
-    response = requests.get(full_endpoint, headers=headers)
+def fetch_session_bootstrap(api_token, logger):
+    """Load everything the app needs about a user right after they log in.
 
-    # print("Status Code:", response.status_code)  # Debugging line to check the status code
-    # print("Response Text:", response.text)  # Debugging line to check the raw response text
+    The user info, team ownership and team list are asked for at the same
+    time. The current team's name comes from the team list, so the team
+    itself only has to be fetched when it isn't in there.
+    """
+    if not api_token:
+        return None
+    executor = _get_executor()
+    user_future = executor.submit(fetch_user_info, api_token)
+    owner_future = executor.submit(is_owner, api_token)
+    teams_future = executor.submit(fetch_user_teams, api_token, logger)
+    user_info = user_future.result()
+    owner = owner_future.result()
+    teams = teams_future.result()
+    if user_info is None:
+        return None
 
-    if response.status_code == 200:
-        try:
-            owner = response.json()
-            return owner['is_owner']
-        except Exception as e:
-            print("Error processing team member data:", e)
-            return None
-    else:
-        print(f"Failed to fetch team members data, Status Code: {response.status_code}")
-        return None
\ No newline at end of file
+    team_id = user_info['current_team_id']
+    team_name = next((team['team_name'] for team in teams or [] if team['id'] == team_id), None)
+    if team_name is None:
+        team_info = fetch_team(api_token, team_id)
+        if team_info is not None:
+            team_name = team_info['team_name']
+    if team_name is None:
+        team_id, team_name = -1, ""
+    return {
+        'user': user_info,
+        'current_team_id': team_id,
+        'current_team_name': team_name,
+        'is_owner': owner,
+        'is_admin': user_info['is_admin'],
+        'teams': teams,
+    }
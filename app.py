@@ -1,18 +1,32 @@
+import functools
+import json
+import time
 from math import trunc
 
 import dash
-from dash import html, dcc, Input, Output, callback_context, State, ALL, ctx
+import flask
+from dash import html, dcc, Input, Output, callback_context, State, ALL, ctx, Patch, ClientsideFunction
 import dash_bootstrap_components as dbc
+from plotly.io.json import to_json_plotly
 import base64
-import pandas as pd
 from dash.exceptions import PreventUpdate
 from firebase_authentication import FirebaseAuthentication
 from urllib.parse import urlparse, parse_qs
-from api import (fetch_words, fetch_meanings, fetch_reflections,
-                 fetch_user_info, fetch_user_teams, fetch_team,
+from api import (fetch_words, fetch_meanings, fetch_reflections, fetch_team,
                  create_word, create_meaning, create_reflection,
                  update_user_with_current_team, fetch_team_members,
-                 is_owner)
+                 is_owner, fetch_session_bootstrap, words_stale_since, word_details_stale_since)
+from changes import latest_created_at, items_since, record_change, stream_team_changes
+from config import (change_poll_interval, change_stream_enabled, change_stream_fallback_interval,
+                    clientside_callbacks_enabled, metrics_enabled)
+from metrics import observe_callback, render_metrics
+from export import export_team, formats as export_formats
+from bulk_import import parse_upload, import_rows
+from prefetch import warm_team
+from session_store import (load_team_words, load_word_details, set_session_data, append_session_item,
+                           merge_session_items)
+from search_index import (search_team, search_word_options, word_label,
+                          index_word, index_words, index_word_details, index_meaning, index_reflection)
 
 app = dash.Dash(
     __name__,
@@ -62,6 +76,10 @@ app.layout = html.Div(
         dcc.Store(id='current-team-id', storage_type='session'),
         dcc.Store(id='current-team-name', storage_type='session'),
         dcc.Store(id='is-team-owner', storage_type='session'),
+        # What was loaded about the user when they logged in
+        dcc.Store(id='session-bootstrap'),
+        # Identifies this browser session's data kept on the server
+        dcc.Store(id='session-id', storage_type='session'),
         html.Div(
             id='alert-bar-div'
         ),
@@ -75,6 +93,8 @@ app.layout = html.Div(
                              style={'width': '33px', 'height': '33px', 'verticalAlign': '', 'order': 2,
                                     'background': 'transparent'}),
                 ]),
+                html.Div(id='search-results',
+                         style={'position': 'absolute', 'zIndex': 1000, 'width': '60%', 'background': 'white'}),
             ], width=8),
             dbc.Col([
                 html.Div(
@@ -142,11 +162,15 @@ app.layout = html.Div(
         html.Div(id='login_pane', hidden=True, children=[
             FirebaseAuthentication(id='firebase_auth'),
         ]),
+        # With the change stream turned on, the browser is told when something
+        # changes, so polling is only a slow fallback for missed changes
         dcc.Interval(
             id='interval-component',
-            interval=30 * 1000,
+            interval=(change_stream_fallback_interval if change_stream_enabled else change_poll_interval) * 1000,
             n_intervals=0
         ),
+        html.Button(id='change-feed-trigger', n_clicks=0, hidden=True),
+        dcc.Store(id='change-feed-team'),
         # Navigation and content
         dbc.Row([
             dbc.Col([
@@ -164,6 +188,37 @@ app.layout = html.Div(
 )
 
 
+def ui_callback(function_name, *dependencies):
+    # Callbacks that only toggle the UI based on values the browser already
+    # has are run in the browser (see assets/ui_callbacks.js). The Python
+    # version is only registered when clientside callbacks are turned off.
+    def register(function):
+        if clientside_callbacks_enabled:
+            app.clientside_callback(ClientsideFunction(namespace='lingo_ui', function_name=function_name),
+                                    *dependencies)
+        else:
+            app.callback(*dependencies)(function)
+        return function
+    return register
+
+
+# Callbacks that load data for a page only run once that page is showing:
+# the current path is passed along as state rather than being an input, so
+# changing the path doesn't trigger them, and the browser only calls them
+# once their page's components are on screen.
+def page_callback(page, *dependencies, **kwargs):
+    def register(function):
+        @functools.wraps(function)
+        def run_on_page(*args):
+            if args[-1] != page:
+                raise PreventUpdate
+            return function(*args[:-1])
+
+        app.callback(*dependencies, State('url', 'pathname'), **kwargs)(run_on_page)
+        return function
+    return register
+
+
 def compute_left_nav(is_admin = False):
     dashboard_item = dbc.NavItem(
                         dbc.NavLink('Dashboard', href='/', id='dashboard-link', active='exact',
@@ -201,16 +256,15 @@ def compute_left_nav(is_admin = False):
     Output(component_id='left-nav', component_property='children'),
     Input(component_id='user-logged-in', component_property='data'),
     Input(component_id='current-team-id', component_property='data'),
-    Input(component_id='firebase_auth', component_property='apiToken'),
+    Input('session-bootstrap', 'data'),
 )
-def show_left_nav(display_name, team_id, api_token):
+def show_left_nav(display_name, team_id, bootstrap):
     if display_name is None or len(display_name.strip()) == 0:
         return []
     else:
-        user_info = fetch_user_info(api_token)
         is_admin = False
-        if user_info is not None:
-            is_admin = user_info['is_admin']
+        if bootstrap is not None:
+            is_admin = bootstrap['is_admin']
 
         return compute_left_nav(is_admin)
 
@@ -259,7 +313,7 @@ def show_profile_image(photo_url):
         return []
 
 
-@app.callback(
+@ui_callback('showLoginButton',
     Output(component_id='login-button-div', component_property='hidden'),
     Input(component_id='user-logged-in', component_property='data')
 )
@@ -270,7 +324,7 @@ def show_login_button(display_name):
         return True
 
 
-@app.callback(
+@ui_callback('showLogoutButton',
     Output(component_id='logout-button-div', component_property='hidden'),
     Input(component_id='user-logged-in', component_property='data')
 )
@@ -302,6 +356,7 @@ def login_perform_login(input_value):
 
 
 @app.callback(
+    Output('session-bootstrap', 'data'),
     Output(component_id='current-team-id', component_property='data', allow_duplicate=True),
     Output(component_id='current-team-name', component_property='data', allow_duplicate=True),
     Output(component_id='is-team-owner', component_property='data', allow_duplicate=True),
@@ -312,23 +367,21 @@ def login_perform_login(input_value):
 def update_user_info(display_name, api_token):
     if display_name is None or len(display_name.strip()) == 0:
         # User logged out
-        return -1, ""
+        return None, -1, "", False
     else:
-        # User is logged in
-        user_info = fetch_user_info(api_token)
-        app.logger.debug(user_info)
-        if user_info is not None:
-            team_info = fetch_team(api_token, user_info['current_team_id'])
-            if team_info is not None:
-                # TODO: Get back info on team membership, change False to appropriate value
-                # return user_info['current_team_id'], team_info['team_name'], False
-                return (user_info['current_team_id'], team_info['team_name'],
-                        is_owner(api_token))
-
-        return -1, "" # Just return the empty string for the team name
+        # User is logged in. Everything else that needs to know about the
+        # user reads it from the bootstrap rather than asking the API again.
+        bootstrap = fetch_session_bootstrap(api_token, app.logger)
+        app.logger.debug(bootstrap)
+        if bootstrap is not None:
+            warm_team(api_token, bootstrap['current_team_id'])
+            return (bootstrap, bootstrap['current_team_id'], bootstrap['current_team_name'],
+                    bootstrap['is_owner'])
+
+        return None, -1, "", False # Just return the empty string for the team name
     # TODO: We should probably format the entire team widget here to make it disappear if there is no current team
 
-@app.callback(
+@ui_callback('updateDisplayedTeam',
     Output(component_id='user_current_team', component_property='children'),
     Output('user_team_card', 'style'),
     Input(component_id='current-team-name', component_property='data')
@@ -343,6 +396,32 @@ def update_displayed_team(team_name):
     return "What??", {'display': 'none'}  # Hide card when empty
 
 
+search_kind_colors = {'word': 'primary', 'meaning': 'success', 'reflection': 'info'}
+
+
+@app.callback(
+    Output('search-results', 'children'),
+    Input('search-bar', 'value'),
+    State('current-team-id', 'data'),
+    State('firebase_auth', 'apiToken'),
+)
+def update_search_results(query, team_id, api_token):
+    if query is None or len(query.strip()) == 0:
+        return []
+    results = search_team(api_token, team_id, query)
+    if len(results) == 0:
+        return dbc.ListGroup([dbc.ListGroupItem("No matches found")])
+    items = []
+    for result in results:
+        items.append(
+            dbc.ListGroupItem([
+                dbc.Badge(result['kind'].capitalize(), color=search_kind_colors[result['kind']],
+                          style={'marginRight': '10px'}),
+                result['text'] if result['kind'] == 'word' else f"{result['word']}: {result['text']}",
+            ], href=f"/reflections?word={result['word_id']}", action=True))
+    return dbc.ListGroup(items)
+
+
 def create_alert(alert_text, color="success", duration=4000):
     return dbc.Alert(alert_text,
                      is_open=True,
@@ -363,71 +442,172 @@ def create_warning_alert(alert_text):
     return create_alert(alert_text, color="warning")
 
 
-@app.callback(
+def is_successful(response):
+    return response is not None and (response.status_code == 200 or response.status_code == 201)
+
+
+def created_item(response):
+    # The API server sends back what it created. Anything that doesn't look
+    # like a created item (no id) is ignored by the callers.
+    try:
+        item = response.json()
+    except ValueError:
+        return None
+    if isinstance(item, dict) and 'id' in item:
+        return item
+    return None
+
+
+def failure_text(response):
+    # A response of None means the API server could not be reached at all
+    if response is None:
+        return "The API server could not be reached."
+    return response.text
+
+
+def stale_notice(saved_at):
+    # Shown above data that came from an earlier copy because the API
+    # server couldn't be reached
+    if saved_at is None:
+        return None
+    minutes = max(0, int((time.time() - saved_at) // 60))
+    age = "less than a minute" if minutes == 0 else f"{minutes} minute{'s' if minutes != 1 else ''}"
+    return dbc.Alert(f"The API server isn't responding, so this was saved {age} ago and may be out of date.",
+                     color="warning", style={'padding': '5px 10px', 'marginBottom': '10px'})
+
+
+# Choices for the glossary table. Sorting and paging happen here on the server,
+# so only the words on the page being viewed are sent to the browser.
+glossary_sort_options = [
+    {'label': 'A to Z', 'value': 'word-asc'},
+    {'label': 'Z to A', 'value': 'word-desc'},
+    {'label': 'Newest first', 'value': 'created-desc'},
+    {'label': 'Oldest first', 'value': 'created-asc'},
+]
+glossary_page_sizes = [25, 50, 100, 250]
+default_glossary_page_size = 50
+
+
+def sort_words(words_data, sort_by):
+    if sort_by == 'word-desc':
+        return sorted(words_data, key=lambda w: w['word'].casefold(), reverse=True)
+    elif sort_by == 'created-desc':
+        return sorted(words_data, key=lambda w: w.get('created_at') or '', reverse=True)
+    elif sort_by == 'created-asc':
+        return sorted(words_data, key=lambda w: w.get('created_at') or '')
+    return sorted(words_data, key=lambda w: w['word'].casefold())
+
+
+def paginate(items, page, page_size):
+    # Returns the items on the requested page, along with the page actually
+    # shown (clamped to the pages that exist) and the number of pages
+    page_count = max(1, -(-len(items) // page_size))
+    page = min(max(page, 0), page_count - 1)
+    start = page * page_size
+    return items[start:start + page_size], page, page_count
+
+
+def render_words_table(words_data):
+    table_header = [
+        # html.Thead(html.Tr([html.Th("Word")]))
+    ]
+    rows = []
+    for word in words_data:
+        rows.append(
+            html.Tr([html.Td(dcc.Link(href=f'/reflections?word={word["id"]}', children=[word["word"]]))]))
+    table_body = [html.Tbody(rows)]
+    return dbc.Table(table_header + table_body, striped=True, bordered=True, hover=True)
+
+
+@page_callback('/glossary',
     Output('word-content', 'children'),
-    Input('url', 'pathname'),
+    Output('glossary-page', 'data'),
+    Output('glossary-page-label', 'children'),
+    Output('glossary-prev-page', 'disabled'),
+    Output('glossary-next-page', 'disabled'),
+    Output('words-since', 'data'),
+    Output('glossary-stale', 'children'),
     Input(component_id='current-team-id', component_property='data'),
     Input('lingo-words-updated', 'data'),
-    State(component_id='firebase_auth', component_property='apiToken')
-)
-def update_words(pathname, team_id, words_updated_flag, api_token):
-    if pathname == '/glossary':
-        words_data = fetch_words(api_token,  team_id)
-        if words_data is not None:
-            table_header = [
-                # html.Thead(html.Tr([html.Th("Word")]))
-            ]
-            rows = []
-            for word in words_data:
-                rows.append(
-                    html.Tr([html.Td(dcc.Link(href=f'/reflections?word={word["id"]}', children=[word["word"]]))]))
-            table_body = [html.Tbody(rows)]
-            table_content = dbc.Table(table_header + table_body, striped=True, bordered=True, hover=True)
-            return table_content
-        else:
-            return html.Div("No words found")
-    return html.Div("Failed to load words, please refresh your browser.")
-
-
-@app.callback(
-    Output('reflection-content', 'children'),
-    Input('url', 'pathname'),
-    Input('word-dropdown', 'value'),
-    Input('lingo-reflections-updated', 'data'),
-    State(component_id='firebase_auth', component_property='apiToken')
+    Input('glossary-refresh', 'data'),
+    Input('glossary-sort', 'value'),
+    Input('glossary-page-size', 'value'),
+    Input('glossary-prev-page', 'n_clicks'),
+    Input('glossary-next-page', 'n_clicks'),
+    State('glossary-page', 'data'),
+    State(component_id='firebase_auth', component_property='apiToken'),
+    State('session-id', 'data')
 )
-def update_reflections(pathname, selected_word_id, reflections_updated_flag, api_token):
-    if pathname == '/reflections':
-        if selected_word_id is not None:
-            reflections_data = fetch_reflections(selected_word_id, api_token)
-            if reflections_data:
-                try:
-                    df = pd.DataFrame(reflections_data)
-                    df = df[['reflection', 'created_at']].rename(columns={
-                        'reflection': 'Reflection',
-                        'created_at': 'Created At'
-                    })
-                    table_content = dbc.Table.from_dataframe(df, striped=True, bordered=True, hover=True)
-                    return table_content
-                except Exception as e:
-                    app.logger.error(f"Error processing reflection data into DataFrame: {e}")
-                    return html.Div("Failed to process reflection data")
-            else:
-                return html.Div("No reflections found for the selected word")
-        return html.Div("Select a word to see reflections")
-    return html.Div("")
+def update_words(team_id, words_updated_flag, words_refresh, sort_by, page_size, prev_clicks, next_clicks,
+                 page, api_token, session_id):
+    page = page or 0
+    page_size = page_size or default_glossary_page_size
+    if ctx.triggered_id == 'glossary-prev-page':
+        page = page - 1
+    elif ctx.triggered_id == 'glossary-next-page':
+        page = page + 1
+    elif ctx.triggered_id in ('glossary-sort', 'glossary-page-size'):
+        page = 0
+
+    # Paging and sorting reuse the words this session already has. They
+    # are only fetched again after a word was submitted from this page.
+    words_data = load_team_words(session_id, api_token, team_id,
+                                 refresh=ctx.triggered_id == 'lingo-words-updated')
+    if words_data is not None and ctx.triggered_id == 'glossary-refresh' and words_refresh:
+        # The redraw carries the words that prompted it, as it may not be
+        # handled by the worker that found them
+        words_data = merge_session_items(session_id, api_token, f"words:{team_id}", words_data,
+                                         words_refresh['words'])
+    if words_data is not None:
+        page_words, page, page_count = paginate(sort_words(words_data, sort_by), page, page_size)
+        return (render_words_table(page_words),
+                page,
+                f"Page {page + 1} of {page_count} ({len(words_data)} words)",
+                page == 0,
+                page >= page_count - 1,
+                latest_created_at(words_data),
+                stale_notice(words_stale_since(api_token, team_id)))
+    else:
+        return html.Div("No words found"), 0, "", True, True, None, None
 
 
-@app.callback(
+@page_callback('/glossary',
+    Output('glossary-refresh', 'data'),
+    Output('glossary-stale', 'children', allow_duplicate=True),
+    Input('interval-component', 'n_intervals'),
+    Input('change-feed-trigger', 'n_clicks'),
+    State('words-since', 'data'),
+    State('glossary-stale', 'children'),
+    State(component_id='current-team-id', component_property='data'),
+    State(component_id='firebase_auth', component_property='apiToken'),
+    State('session-id', 'data'),
+    prevent_initial_call=True
+)
+def sync_words(n_intervals, change_clicks, words_since, shown_stale, team_id, api_token, session_id):
+    # The word list is revalidated with the API server, so this is cheap when
+    # nothing changed, and the browser only hears about it when something did
+    words_data = fetch_words(api_token, team_id, revalidate=True)
+    new_words = items_since(words_data, words_since)
+    stale = stale_notice(words_stale_since(api_token, team_id))
+    if len(new_words) == 0:
+        if (stale is None) == (shown_stale is None):
+            raise PreventUpdate
+        return dash.no_update, stale
+    set_session_data(session_id, api_token, f"words:{team_id}", words_data)
+    index_words(team_id, new_words)
+    record_change(team_id, latest_created_at(new_words))
+    return {'at': time.time(), 'words': new_words}, stale
+
+
+@page_callback('/teams',
     Output('team-member-content', 'children'),
-    Input('url', 'pathname'),
     Input('current-team-id', 'data'),
     Input('is-team-owner', 'data'),
     State(component_id='firebase_auth', component_property='apiToken'),
 )
-def update_team_members(pathname, current_team_id, is_team_owner, api_token):
+def update_team_members(current_team_id, is_team_owner, api_token):
     print(is_team_owner)
-    if pathname == '/teams' and is_team_owner:
+    if is_team_owner:
         # TODO: Actually make an API call
         # Get current team ID
         print(current_team_id)
@@ -436,16 +616,9 @@ def update_team_members(pathname, current_team_id, is_team_owner, api_token):
             team_members = fetch_team_members(api_token, current_team_id)
             if team_members:
                 try:
-                    df = pd.DataFrame(team_members)
-                    df = df[['last_name', 'first_name', 'email']].rename(columns={
-                        'last_name': 'Last',
-                        'first_name': 'First',
-                        'email': 'Email'
-                    })
-                    table_content = dbc.Table.from_dataframe(df, striped=True, bordered=True, hover=True)
-                    return table_content
+                    return records_table(team_members, team_member_columns)
                 except Exception as e:
-                    app.logger.error(f"Error processing team members data into DataFrame: {e}")
+                    app.logger.error(f"Error processing team members data into a table: {e}")
                     return html.Div("Failed to process team members data")
             else:
                 return html.Div("No team members found")
@@ -470,155 +643,416 @@ def update_team_members(pathname, current_team_id, is_team_owner, api_token):
     #     return html.Div("Names of team members will be here")
     # return html.Div("")
 
-@app.callback(
+# Columns shown for each kind of table, as (field, heading) pairs
+meaning_columns = [('meaning', 'Meaning'), ('created_at', 'Created At')]
+reflection_columns = [('reflection', 'Reflection'), ('created_at', 'Created At')]
+team_member_columns = [('last_name', 'Last'), ('first_name', 'First'), ('email', 'Email')]
+
+
+def record_row(record, columns):
+    return html.Tr([html.Td(record[field]) for field, _ in columns])
+
+
+def records_table(records, columns):
+    # Builds the same table dbc.Table.from_dataframe would, straight from the
+    # list of records the API server sends back
+    header = html.Thead([html.Tr([html.Th(heading) for _, heading in columns])])
+    body = html.Tbody([record_row(record, columns) for record in records])
+    return dbc.Table([header, body], striped=True, bordered=True, hover=True)
+
+
+def render_meanings(meanings_data):
+    if meanings_data:
+        try:
+            return records_table(meanings_data, meaning_columns)
+        except Exception as e:
+            app.logger.error(f"Error processing meaning data into a table: {e}")
+            return html.Div("Failed to process meaning data")
+    else:
+        return html.Div("No meanings found for the selected word")
+
+
+def render_reflections(reflections_data):
+    if reflections_data:
+        try:
+            return records_table(reflections_data, reflection_columns)
+        except Exception as e:
+            app.logger.error(f"Error processing reflection data into a table: {e}")
+            return html.Div("Failed to process reflection data")
+    else:
+        return html.Div("No reflections found for the selected word")
+
+
+def meaning_row(meaning):
+    return record_row(meaning, meaning_columns)
+
+
+def reflection_row(reflection):
+    return record_row(reflection, reflection_columns)
+
+
+def append_table_rows(rows):
+    # Adds rows to the end of the body of a table made by dbc.Table.from_dataframe
+    table = Patch()
+    table['props']['children'][1]['props']['children'].extend(rows)
+    return table
+
+
+@page_callback('/reflections',
     Output('meaning-content', 'children'),
-    Input('url', 'pathname'),
+    Output('reflection-content', 'children'),
+    Output('word-details-since', 'data'),
+    Output('word-details-stale', 'children'),
     Input('word-dropdown', 'value'),
     Input('lingo-meanings-updated', 'data'),
-    State(component_id='firebase_auth', component_property='apiToken')
+    Input('lingo-reflections-updated', 'data'),
+    State(component_id='firebase_auth', component_property='apiToken'),
+    State('session-id', 'data')
 )
-def update_meanings(pathname, selected_word_id, meanings_updated_flag, api_token):
-    if pathname == '/reflections':
-        if selected_word_id is not None:
-            meanings_data = fetch_meanings(selected_word_id, api_token)
-            if meanings_data:
-                try:
-                    df = pd.DataFrame(meanings_data)
-                    df = df[['meaning', 'created_at']].rename(columns={
-                        'meaning': 'Meaning',
-                        'created_at': 'Created At'
-                    })
-                    table_content = dbc.Table.from_dataframe(df, striped=True, bordered=True, hover=True)
-                    return table_content
-                except Exception as e:
-                    app.logger.error(f"Error processing meaning data into DataFrame: {e}")
-                    return html.Div("Failed to process meaning data")
-            else:
-                return html.Div("No meanings found for the selected word")
-        return html.Div("Select a word to see meanings")
-    return html.Div("")
+def update_word_details(selected_word_id, meanings_updated_flag, reflections_updated_flag, api_token,
+                        session_id):
+    if selected_word_id is not None:
+        # After a submit only the list that changed needs to be loaded again
+        if ctx.triggered_id == 'lingo-meanings-updated':
+            meanings_data = fetch_meanings(selected_word_id, api_token, revalidate=True)
+            set_session_data(session_id, api_token, f"meanings:{selected_word_id}", meanings_data)
+            since = Patch()
+            since['meanings'] = latest_created_at(meanings_data)
+            return (render_meanings(meanings_data), dash.no_update, since,
+                    stale_notice(word_details_stale_since(api_token, selected_word_id)))
+        if ctx.triggered_id == 'lingo-reflections-updated':
+            reflections_data = fetch_reflections(selected_word_id, api_token, revalidate=True)
+            set_session_data(session_id, api_token, f"reflections:{selected_word_id}", reflections_data)
+            since = Patch()
+            since['reflections'] = latest_created_at(reflections_data)
+            return (dash.no_update, render_reflections(reflections_data), since,
+                    stale_notice(word_details_stale_since(api_token, selected_word_id)))
+        meanings_data, reflections_data = load_word_details(session_id, api_token, selected_word_id)
+        since = {'word_id': selected_word_id,
+                 'meanings': latest_created_at(meanings_data),
+                 'reflections': latest_created_at(reflections_data)}
+        return (render_meanings(meanings_data), render_reflections(reflections_data), since,
+                stale_notice(word_details_stale_since(api_token, selected_word_id)))
+    return html.Div("Select a word to see meanings"), html.Div("Select a word to see reflections"), None, None
+
+
+@page_callback('/reflections',
+    Output('meaning-content', 'children', allow_duplicate=True),
+    Output('reflection-content', 'children', allow_duplicate=True),
+    Output('word-details-since', 'data', allow_duplicate=True),
+    Output('word-details-stale', 'children', allow_duplicate=True),
+    Input('interval-component', 'n_intervals'),
+    Input('change-feed-trigger', 'n_clicks'),
+    State('word-details-since', 'data'),
+    State('word-details-stale', 'children'),
+    State(component_id='current-team-id', component_property='data'),
+    State(component_id='firebase_auth', component_property='apiToken'),
+    State('session-id', 'data'),
+    prevent_initial_call=True
+)
+def sync_word_details(n_intervals, change_clicks, since, shown_stale, team_id, api_token, session_id):
+    # Only the meanings and reflections created since the tables were drawn
+    # are sent to the browser, and they are added to the end of the tables
+    if not since or since.get('word_id') is None:
+        raise PreventUpdate
+    word_id = since['word_id']
+    meanings_data, reflections_data = load_word_details(session_id, api_token, word_id, refresh=True)
+    new_meanings = items_since(meanings_data, since['meanings'])
+    new_reflections = items_since(reflections_data, since['reflections'])
+    stale = stale_notice(word_details_stale_since(api_token, word_id))
+    if len(new_meanings) == 0 and len(new_reflections) == 0:
+        if (stale is None) == (shown_stale is None):
+            raise PreventUpdate
+        return dash.no_update, dash.no_update, dash.no_update, stale
+
+    meanings_output = dash.no_update
+    reflections_output = dash.no_update
+    new_since = Patch()
+    if len(new_meanings) > 0:
+        if since['meanings'] is None:
+            # The table wasn't drawn yet, since there was nothing to show
+            meanings_output = render_meanings(meanings_data)
+        else:
+            meanings_output = append_table_rows([meaning_row(m) for m in new_meanings])
+        new_since['meanings'] = latest_created_at(new_meanings)
+    if len(new_reflections) > 0:
+        if since['reflections'] is None:
+            reflections_output = render_reflections(reflections_data)
+        else:
+            reflections_output = append_table_rows([reflection_row(r) for r in new_reflections])
+        new_since['reflections'] = latest_created_at(new_reflections)
+    index_word_details(team_id, word_id, new_meanings, new_reflections)
+    record_change(team_id, latest_created_at(new_meanings + new_reflections))
+    return meanings_output, reflections_output, new_since, stale
 
 
-@app.callback(
+# The word dropdown only ever holds a short list of words. The options are
+# looked up on the server from whatever has been typed into the dropdown.
+word_option_limit = 20
+
+
+def to_word_options(words):
+    return [{'label': label, 'value': word_id} for word_id, label in words]
+
+
+@page_callback('/reflections',
     Output('word-dropdown', 'options'),
     Output('word-dropdown', 'value'),
-    Input('url', 'pathname'),
     Input('url', 'search'),
     Input(component_id='current-team-id', component_property='data'),
     State(component_id='firebase_auth', component_property='apiToken'),
 )
-def update_word_options(pathname, search, team_id, api_token):
-    if pathname == '/reflections':
-        query_params = {}
-        if len(search) > 1:
-            query_params = parse_qs(search[1:])
-
-        words_data = fetch_words(api_token, team_id)  # Endpoint that returns all words
-        if words_data is not None:
-            word_options = [{'label': word['word'], 'value': word['id']} for word in words_data]
-            if 'word' in query_params and query_params['word'] is not None:
-                query_word = query_params['word']
-                if type(query_word) is list and len(query_word) > 0:
-                    query_word = int(query_word[0])
-                else:
-                    query_word = int(query_word)
-                return word_options, query_word
-            else:
-                return word_options, 0
+def update_word_options(search, team_id, api_token):
+    query_params = {}
+    if len(search) > 1:
+        query_params = parse_qs(search[1:])
+
+    word_options = search_word_options(api_token, team_id, None, word_option_limit)
+    if 'word' in query_params and query_params['word'] is not None:
+        query_word = query_params['word']
+        if type(query_word) is list and len(query_word) > 0:
+            query_word = int(query_word[0])
         else:
-            return [], 0
-    return [], 0
+            query_word = int(query_word)
+        # Make sure the word in the link is one of the options, even if it
+        # isn't one of the first words, so it shows as selected
+        label = word_label(api_token, team_id, query_word)
+        if label is not None and query_word not in [word_id for word_id, _ in word_options]:
+            word_options = [(query_word, label)] + word_options[:word_option_limit - 1]
+        return to_word_options(word_options), query_word
+    else:
+        return to_word_options(word_options), 0
+
+
+@app.callback(
+    Output('word-dropdown', 'options', allow_duplicate=True),
+    Input('word-dropdown', 'search_value'),
+    State('word-dropdown', 'value'),
+    State(component_id='current-team-id', component_property='data'),
+    State(component_id='firebase_auth', component_property='apiToken'),
+    prevent_initial_call=True
+)
+def update_word_search_options(search_value, selected_word_id, team_id, api_token):
+    if not search_value:
+        raise PreventUpdate
+    word_options = search_word_options(api_token, team_id, search_value, word_option_limit)
+    # The selected word has to stay in the options or the dropdown clears it
+    if selected_word_id and selected_word_id not in [word_id for word_id, _ in word_options]:
+        label = word_label(api_token, team_id, selected_word_id)
+        if label is not None:
+            word_options.append((selected_word_id, label))
+    return to_word_options(word_options)
+
+
+def refetch_after_failure(response):
+    # Only a failure the API server answered (a conflict, for instance) means
+    # our copy of the list may be wrong. If it couldn't be reached there is no
+    # point asking it again straight away.
+    return time.time() if response is not None else dash.no_update
 
 
 @app.callback(
     Output('alert-bar-div', 'children', allow_duplicate=True),
     Output('word-input', 'value'),
     Output('lingo-words-updated', 'data'),
+    Output('glossary-refresh', 'data', allow_duplicate=True),
     Input('submit-word', 'n_clicks'),
     State('word-input', 'value'),
     State('firebase_auth', 'apiToken'),
     State(component_id='current-team-id', component_property='data'),
+    State('session-id', 'data'),
     prevent_initial_call=True
 )
-def submit_word(n_clicks, word, api_token, current_team_id):
+def submit_word(n_clicks, word, api_token, current_team_id, session_id):
     if n_clicks:
         if word is not None:
             # TODO: Add team ID to call
             response = create_word(api_token, current_team_id, word)
-            if response.status_code == 200 or response.status_code == 201:
-                return (create_success_alert("Word submitted successfully!"),
-                        '',
-                        n_clicks)
+            if is_successful(response):
+                new_word = created_item(response)
+                if new_word is None:
+                    return create_success_alert("Word submitted successfully!"), '', time.time(), dash.no_update
+                # Add the new word to the words we already have and redraw the
+                # page from them, rather than fetching every word again
+                index_word(current_team_id, new_word)
+                record_change(current_team_id, new_word.get('created_at'))
+                append_session_item(session_id, api_token, f"words:{current_team_id}", new_word)
+                return (create_success_alert("Word submitted successfully!"), '', dash.no_update,
+                        {'at': time.time(), 'words': [new_word]})
             else:
-                return (create_danger_alert(f"Failed to submit word. Error: {response.text}"),
+                return (create_danger_alert(f"Failed to submit word. Error: {failure_text(response)}"),
                         word,
-                        n_clicks)
+                        refetch_after_failure(response),
+                        dash.no_update)
         else:
             return (
                 create_warning_alert("Please enter a word before submitting."),
                 word,
-                n_clicks)
-    return html.Div(), word, n_clicks
+                dash.no_update,
+                dash.no_update)
+    return html.Div(), word, dash.no_update, dash.no_update
+
+
+import_result_columns = [('row', 'Row'), ('word', 'Word'), ('result', 'Result')]
+import_max_upload_bytes = 5 * 1024 * 1024
+
+
+@app.callback(
+    Output('alert-bar-div', 'children', allow_duplicate=True),
+    Output('import-results', 'children'),
+    Output('lingo-words-updated', 'data', allow_duplicate=True),
+    Output('import-upload', 'contents'),
+    Input('import-upload', 'contents'),
+    State('import-upload', 'filename'),
+    State('firebase_auth', 'apiToken'),
+    State(component_id='current-team-id', component_property='data'),
+    prevent_initial_call=True
+)
+def import_words(contents, filename, api_token, current_team_id):
+    if contents is None:
+        raise PreventUpdate
+    try:
+        rows = parse_upload(contents, filename or '')
+    except ValueError as e:
+        return create_danger_alert(f"Failed to import {filename}. {e}"), html.Div(), dash.no_update, None
+
+    existing_words = fetch_words(api_token, current_team_id, revalidate=True)
+    if existing_words is None:
+        return (create_danger_alert("Failed to import words, as the team's words could not be loaded."),
+                html.Div(), dash.no_update, None)
+    started = time.perf_counter()
+    results, new_words = import_rows(api_token, current_team_id, rows, existing_words)
+    app.logger.info(f"Imported {len(rows)} rows into team {current_team_id} in {time.perf_counter() - started:.1f}s")
+    for new_word in new_words:
+        index_word(current_team_id, new_word)
+    record_change(current_team_id, latest_created_at(new_words))
+
+    failed = sum(1 for result in results.values() if result.startswith("Failed"))
+    added = sum(1 for result in results.values() if result.startswith("Added"))
+    left = sum(1 for result in results.values() if result.startswith("Not imported"))
+    summary = (f"Imported {filename}: {added} rows added, {len(rows) - added - failed - left} skipped, "
+               f"{failed} failed.")
+    if left:
+        summary += f" {left} rows were not imported in time; upload them again to add them."
+    alert = create_danger_alert(summary) if failed or left else create_success_alert(summary)
+    table = records_table([dict(row, result=results.get(row['row'], '')) for row in rows], import_result_columns)
+    return alert, table, time.time() if added else dash.no_update, None
 
 
 @app.callback(
     Output('alert-bar-div', 'children', allow_duplicate=True),
     Output('meaning-input', 'value'),
     Output('lingo-meanings-updated', 'data'),
+    Output('meaning-content', 'children', allow_duplicate=True),
+    Output('word-details-since', 'data', allow_duplicate=True),
     Input('submit-meaning', 'n_clicks'),
     State('word-dropdown', 'value'),
     State('meaning-input', 'value'),
     State('firebase_auth', 'apiToken'),
+    State('current-team-id', 'data'),
+    State('word-details-since', 'data'),
+    State('session-id', 'data'),
     prevent_initial_call=True
 )
-def submit_meaning(n_clicks, word_id, meaning, api_token):
+def submit_meaning(n_clicks, word_id, meaning, api_token, current_team_id, since, session_id):
     if n_clicks:
         if word_id is not None and meaning is not None:
             response = create_meaning(api_token, word_id, meaning)
-            if response.status_code == 200 or response.status_code == 201:
-                return (create_success_alert("Meaning submitted successfully!"),
-                        '',
-                        n_clicks)
+            if is_successful(response):
+                new_meaning = created_item(response)
+                if new_meaning is None or not since or since.get('word_id') != word_id:
+                    return (create_success_alert("Meaning submitted successfully!"), '', time.time(),
+                            dash.no_update, dash.no_update)
+                index_meaning(current_team_id, word_id, new_meaning)
+                record_change(current_team_id, new_meaning.get('created_at'))
+                append_session_item(session_id, api_token, f"meanings:{word_id}", new_meaning)
+                # Add the row to the table on the page, or draw the table if
+                # this is the word's first meaning
+                if since['meanings'] is None:
+                    meanings_output = render_meanings([new_meaning])
+                else:
+                    meanings_output = append_table_rows([meaning_row(new_meaning)])
+                new_since = Patch()
+                new_since['meanings'] = new_meaning.get('created_at')
+                return (create_success_alert("Meaning submitted successfully!"), '', dash.no_update,
+                        meanings_output, new_since)
             else:
-                return (create_danger_alert(f"Failed to submit meaning. Error: {response.text}"),
+                return (create_danger_alert(f"Failed to submit meaning. Error: {failure_text(response)}"),
                         meaning,
-                        n_clicks)
+                        refetch_after_failure(response),
+                        dash.no_update,
+                        dash.no_update)
         else:
             return (
                 create_warning_alert("Please select a word and enter a meaning before submitting."),
                 meaning,
-                n_clicks)
-    return html.Div(), meaning, n_clicks
+                dash.no_update,
+                dash.no_update,
+                dash.no_update)
+    return html.Div(), meaning, dash.no_update, dash.no_update, dash.no_update
 
 
 @app.callback(
     Output('alert-bar-div', 'children', allow_duplicate=True),
     Output('reflection-input', 'value'),
     Output('lingo-reflections-updated', 'data'),
+    Output('reflection-content', 'children', allow_duplicate=True),
+    Output('word-details-since', 'data', allow_duplicate=True),
     Input('submit-reflection', 'n_clicks'),
     State('word-dropdown', 'value'),
     State('reflection-input', 'value'),
     State('firebase_auth', 'apiToken'),
+    State('current-team-id', 'data'),
+    State('word-details-since', 'data'),
+    State('session-id', 'data'),
     prevent_initial_call=True,
 )
-def submit_reflection(n_clicks, word_id, reflection, api_token):
+def submit_reflection(n_clicks, word_id, reflection, api_token, current_team_id, since, session_id):
     if n_clicks:
         if word_id is not None and reflection is not None:
             response = create_reflection(api_token, word_id, reflection)
-            if response.status_code == 200 or response.status_code == 201:
-                return create_success_alert("Reflection submitted successfully!"), '', n_clicks
+            if is_successful(response):
+                new_reflection = created_item(response)
+                if new_reflection is None or not since or since.get('word_id') != word_id:
+                    return (create_success_alert("Reflection submitted successfully!"), '', time.time(),
+                            dash.no_update, dash.no_update)
+                index_reflection(current_team_id, word_id, new_reflection)
+                record_change(current_team_id, new_reflection.get('created_at'))
+                append_session_item(session_id, api_token, f"reflections:{word_id}", new_reflection)
+                if since['reflections'] is None:
+                    reflections_output = render_reflections([new_reflection])
+                else:
+                    reflections_output = append_table_rows([reflection_row(new_reflection)])
+                new_since = Patch()
+                new_since['reflections'] = new_reflection.get('created_at')
+                return (create_success_alert("Reflection submitted successfully!"), '', dash.no_update,
+                        reflections_output, new_since)
             else:
-                return (create_danger_alert(f"Failed to submit reflection. Error: {response.text}"),
+                return (create_danger_alert(f"Failed to submit reflection. Error: {failure_text(response)}"),
                         reflection,
-                        n_clicks)
+                        refetch_after_failure(response),
+                        dash.no_update,
+                        dash.no_update)
         else:
             return (create_warning_alert("Please select a word and enter a reflection before submitting."),
                     reflection,
-                    n_clicks)
-    return html.Div(), reflection, n_clicks
+                    dash.no_update,
+                    dash.no_update,
+                    dash.no_update)
+    return html.Div(), reflection, dash.no_update, dash.no_update, dash.no_update
 
 
-@app.callback(
+@ui_callback('fillExportForm',
+    Output('export-token', 'value'),
+    Output('export-team-id', 'value'),
+    Input('firebase_auth', 'apiToken'),
+    Input('current-team-id', 'data')
+)
+def fill_export_form(api_token, team_id):
+    return api_token, team_id
+
+
+@ui_callback('updateSubmitWordButton',
     Output('submit-word', 'disabled'),
     Input('word-input', 'value')
 )
@@ -626,7 +1060,7 @@ def update_submit_word_button(meaning_input):
     return meaning_input is None or len(meaning_input.strip()) == 0
 
 
-@app.callback(
+@ui_callback('updateSubmitMeaningButton',
     Output('submit-meaning', 'disabled'),
     Input('word-dropdown', 'value'),
     Input('meaning-input', 'value')
@@ -635,7 +1069,7 @@ def update_submit_meaning_button(word_value, meaning_input):
     return word_value is None or word_value == 0 or meaning_input is None or len(meaning_input.strip()) == 0
 
 
-@app.callback(
+@ui_callback('updateSubmitReflectionButton',
     Output('submit-reflection', 'disabled'),
     Input('word-dropdown', 'value'),
     Input('reflection-input', 'value')
@@ -666,7 +1100,7 @@ def update_current_team(clicks, api_token):
     # Attempt to update our current team. Then we can just get info
     # back about our new current team.
     response = update_user_with_current_team(api_token, updated_team_id)
-    if response is None:
+    if not is_successful(response):
         app.logger.error(f"Failed to update team for {updated_team_id}")
     else:
         team_info = fetch_team(api_token, updated_team_id)
@@ -675,29 +1109,19 @@ def update_current_team(clicks, api_token):
         else:
             # TODO: Get back info on team membership, set False to appropriate value
             # return updated_team_id, team_info['team_name'], False
-            user_info = fetch_user_info(api_token)
+            warm_team(api_token, updated_team_id)
             return updated_team_id, team_info['team_name'], is_owner(api_token)
 
 
+# Apart from the teams grid, the pages don't depend on who is logged in, so
+# each one is built and serialized once (see static_pages below). The token
+# isn't an input here, so refreshing it doesn't re-render the page.
 @app.callback(
     Output('page-content', 'children'),
     Input('url', 'pathname'),
-    Input('url', 'search'),
-    Input('firebase_auth', 'apiToken'),
-    State('is-team-owner', 'data')
-    # Input('lingo-words-updated', 'data'),
-    # Input('lingo-meanings-updated', 'data'),
-    # Input('lingo-reflections-updated', 'data')
-)
-def update_page_content(pathname, search, api_token, is_team_owner):
-    if pathname == '/':
-        return display_main_page()
-    elif pathname == '/glossary':
-        return display_glossary_page()
-    elif pathname == '/reflections':
-        return display_reflections_page(search)
-    elif pathname == '/teams':
-        return display_teams_page(api_token, is_team_owner)
+)
+def update_page_content(pathname):
+    return static_pages.get(pathname)
 
 
 def display_main_page():
@@ -745,7 +1169,7 @@ def display_main_page():
                     dbc.Card([
                         dbc.CardHeader("Words"),
                         dbc.CardBody([
-                            html.Div(id='word-content'),
+                            html.Div(id='dashboard-word-content'),
                         ])
                     ])
                 ], width=6),
@@ -754,13 +1178,13 @@ def display_main_page():
                         dbc.CardHeader("Meanings and Reflections"),
                         dbc.CardBody([
                             dcc.Dropdown(
-                                id='word-dropdown',
+                                id='dashboard-word-dropdown',
                                 options=[],
                                 placeholder='Select a word...',
                                 style={'marginBottom': '10px'}
                             ),
-                            html.Div(id='meaning-content'),
-                            html.Div(id='reflection-content')
+                            html.Div(id='dashboard-meaning-content'),
+                            html.Div(id='dashboard-reflection-content')
 
                         ])
                     ])
@@ -782,7 +1206,40 @@ def display_glossary_page():
                 dbc.Card([
                     dbc.CardHeader("Words"),
                     dbc.CardBody([
+                        dcc.Store(id='glossary-page', data=0),
+                        dcc.Store(id='words-since'),
+                        dcc.Store(id='glossary-refresh'),
+                        dbc.Row([
+                            dbc.Col([
+                                dcc.Dropdown(id='glossary-sort', options=glossary_sort_options,
+                                             value='word-asc', clearable=False),
+                            ], width=6),
+                            dbc.Col([
+                                dcc.Dropdown(id='glossary-page-size',
+                                             options=[{'label': f"{size} per page", 'value': size}
+                                                      for size in glossary_page_sizes],
+                                             value=default_glossary_page_size, clearable=False),
+                            ], width=6),
+                        ], style={'marginBottom': '10px'}),
+                        html.Div(id='glossary-stale'),
                         html.Div(id='word-content'),
+                        html.Div([
+                            html.Button('Previous', id='glossary-prev-page', disabled=True,
+                                        className='btn btn-outline-secondary btn-sm'),
+                            html.Span(id='glossary-page-label', style={'margin': '0px 10px'}),
+                            html.Button('Next', id='glossary-next-page', disabled=True,
+                                        className='btn btn-outline-secondary btn-sm'),
+                        ], style={'display': 'flex', 'alignItems': 'center', 'justifyContent': 'center'}),
+                        # The token is posted with the form rather than put in
+                        # the link, so it doesn't end up in logs or history
+                        html.Form([
+                            dcc.Input(id='export-token', name='token', type='hidden'),
+                            dcc.Input(id='export-team-id', name='team_id', type='hidden'),
+                            html.Button('Export CSV', name='format', value='csv', type='submit',
+                                        className='btn btn-outline-primary btn-sm', style={'marginRight': '5px'}),
+                            html.Button('Export JSONL', name='format', value='jsonl', type='submit',
+                                        className='btn btn-outline-primary btn-sm'),
+                        ], action='/export', method='POST', target='_blank', style={'marginTop': '10px'}),
                     ])
                 ])
             ], width=6),
@@ -803,16 +1260,28 @@ def display_glossary_page():
                     dbc.CardBody([
                         html.Div(id='submit-word-message')
                     ])
-                ])
+                ]),
+                dbc.Card([
+                    dbc.CardHeader("Import Words"),
+                    dbc.CardBody([
+                        dcc.Upload(
+                            id='import-upload',
+                            children=html.Div("Drop a CSV or JSON file here, or click to choose one"),
+                            accept='.csv,.json',
+                            max_size=import_max_upload_bytes,
+                            style={'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px',
+                                   'padding': '20px', 'textAlign': 'center', 'cursor': 'pointer'}
+                        ),
+                        dcc.Loading(html.Div(id='import-results',
+                                             style={'maxHeight': '300px', 'overflowY': 'auto', 'marginTop': '10px'})),
+                    ])
+                ], style={'marginTop': '20px'})
             ], width=6)
         ])
     ])
 
 
-def display_reflections_page(search):
-    query_params = {}
-    if len(search) > 1:
-        query_params = parse_qs(search[1:])
+def display_reflections_page():
     return html.Div([
         dbc.Row([
             dbc.Col([
@@ -825,6 +1294,8 @@ def display_reflections_page(search):
                             placeholder='Select a word...',
                             style={'marginBottom': '10px'}
                         ),
+                        dcc.Store(id='word-details-since'),
+                        html.Div(id='word-details-stale'),
                         html.Div(id='meaning-content'),
                         html.Div(id='reflection-content')
 
@@ -872,8 +1343,48 @@ def display_reflections_page(search):
     ])
 
 
-def display_teams_page(api_token, is_team_owner):
-    teams = fetch_user_teams(api_token, app.logger)
+def display_teams_page():
+    return html.Div([
+        html.Div(id='teams-grid'),
+        html.Div(
+            dbc.Row([
+                dbc.Col([
+                    dbc.Card([
+                        dbc.CardHeader("Team Members"),
+                        dbc.CardBody([
+                            html.Div(id='team-member-content')
+                        ])
+                    ])
+                ], width=9)]),
+            id='team-members-row', hidden=True
+        )
+    ])
+
+
+def serialize_layout(layout):
+    # The JSON form of a layout is what a callback sends back anyway, so
+    # returning it saves walking the component tree on every request
+    return json.loads(to_json_plotly(layout))
+
+
+static_pages = {
+    '/': serialize_layout(display_main_page()),
+    '/glossary': serialize_layout(display_glossary_page()),
+    '/reflections': serialize_layout(display_reflections_page()),
+    '/teams': serialize_layout(display_teams_page()),
+}
+
+
+@page_callback('/teams',
+    Output('teams-grid', 'children'),
+    Output('team-members-row', 'hidden'),
+    Input('session-bootstrap', 'data'),
+    Input('is-team-owner', 'data'),
+)
+def update_teams_grid(bootstrap, is_team_owner):
+    teams = None
+    if bootstrap is not None:
+        teams = bootstrap['teams']
     # Initialize the row_count to 0. If we don't have any teams
     # come back (API call error, user not logged in), this will be
     # the default. A logged-in user should always have at least 1 team.
@@ -907,22 +1418,95 @@ def display_teams_page(api_token, is_team_owner):
             cols.append(current_card)
         rows.append(dbc.Row(cols))
 
-    if is_team_owner:
-        team_info_row = dbc.Row([
-            dbc.Col([
-                dbc.Card([
-                    dbc.CardHeader("Team Members"),
-                    dbc.CardBody([
-                        html.Div(id='team-member-content')
-                    ])
-                ])
-            ], width=9)])
-        rows.append(team_info_row)
+    return rows, not is_team_owner
 
-    return html.Div(rows)
 
+app.clientside_callback(
+    ClientsideFunction(namespace='lingo_session', function_name='ensureSessionId'),
+    Output('session-id', 'data'),
+    Input('url', 'pathname'),
+    State('session-id', 'data'),
+)
 
 server = app.server
 
+
+if metrics_enabled:
+    # Callbacks are timed around the request that runs them, and labelled
+    # with the name of the function that handles the callback
+    dash_update_path = f"{app.config.routes_pathname_prefix}_dash-update-component"
+
+    def callback_name(output):
+        callback = app.callback_map.get(output, {}).get('callback')
+        return getattr(callback, '__name__', 'unknown')
+
+    @server.before_request
+    def start_request_timer():
+        flask.g.request_started = time.perf_counter()
+
+    @server.after_request
+    def record_callback_time(response):
+        if flask.request.path == dash_update_path and 'request_started' in flask.g:
+            body = flask.request.get_json(silent=True) or {}
+            observe_callback(callback_name(body.get('output')), flask.g.request_started)
+        return response
+
+    @server.route('/metrics')
+    def metrics():
+        body, content_type = render_metrics()
+        return server.response_class(body, content_type=content_type)
+
+
+@server.route('/export', methods=['POST'])
+def export():
+    # Streams a team's words, meanings, and reflections, loading them as the
+    # file is written, so a large team never has to fit in memory
+    api_token = flask.request.form.get('token')
+    export_format = flask.request.form.get('format', 'csv')
+    try:
+        team_id = int(flask.request.form['team_id'])
+        start_after = flask.request.form.get('start_after')
+        start_after = int(start_after) if start_after else None
+        word_ids = flask.request.form.get('word_ids')
+        word_ids = {int(word_id) for word_id in word_ids.split(',')} if word_ids else None
+    except (KeyError, ValueError):
+        return "A team_id is needed, and it, start_after, and word_ids must be numbers", 400
+    if export_format not in export_formats:
+        return f"The format must be one of {', '.join(export_formats)}", 400
+
+    export = export_team(api_token, team_id, export_format, start_after, word_ids)
+    if export is None:
+        return "The team's words could not be loaded", 403
+    content_type, lines = export
+    app.logger.info(f"Exporting team {team_id} as {export_format}")
+    return server.response_class(flask.stream_with_context(lines), content_type=content_type, headers={
+        'Content-Disposition': f'attachment; filename="team-{team_id}-glossary.{export_format}"',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+if change_stream_enabled:
+    # Each open tab listens for changes to its team instead of polling.
+    # A stream holds a connection open for as long as the tab is open.
+    app.clientside_callback(
+        ClientsideFunction(namespace='lingo_changes', function_name='watch'),
+        Output('change-feed-team', 'data'),
+        Input('current-team-id', 'data'),
+        Input('firebase_auth', 'apiToken'),
+    )
+
+    @server.route('/changes/<int:team_id>')
+    def change_stream(team_id):
+        # EventSource can't send headers, so the token comes in the query.
+        # Only users who can read the team's words may follow its changes.
+        api_token = flask.request.args.get('token')
+        if not api_token or fetch_words(api_token, team_id) is None:
+            return "The team's words could not be loaded", 403
+        stream = stream_team_changes(team_id)
+        if stream is None:
+            return "Too many change streams are open, try again later", 503
+        return server.response_class(stream, mimetype='text/event-stream',
+                                     headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
     app.run_server(debug=True)
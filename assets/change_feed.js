@@ -0,0 +1,25 @@
+// Listens to the change stream for the current team. When something new
+// shows up in the team, the hidden change-feed-trigger button is clicked,
+// which runs the callbacks that fetch only the new items.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    lingo_changes: {
+        watch: function (teamId, apiToken) {
+            if (window.lingoChangeSource) {
+                window.lingoChangeSource.close();
+                window.lingoChangeSource = null;
+            }
+            if (teamId === null || teamId === undefined || teamId === -1 || !apiToken) {
+                return window.dash_clientside.no_update;
+            }
+            const source = new EventSource('/changes/' + teamId + '?token=' + encodeURIComponent(apiToken));
+            source.addEventListener('change', function () {
+                const trigger = document.getElementById('change-feed-trigger');
+                if (trigger) {
+                    trigger.click();
+                }
+            });
+            window.lingoChangeSource = source;
+            return teamId;
+        }
+    }
+});
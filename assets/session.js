@@ -0,0 +1,19 @@
+// Gives each browser session a random ID the first time a page is shown.
+// The server keeps the data it fetched for the session under this ID.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    lingo_session: {
+        ensureSessionId: function (pathname, sessionId) {
+            if (sessionId) {
+                return window.dash_clientside.no_update;
+            }
+            if (window.crypto && window.crypto.randomUUID) {
+                return window.crypto.randomUUID();
+            }
+            const bytes = new Uint8Array(16);
+            window.crypto.getRandomValues(bytes);
+            return Array.from(bytes, function (b) {
+                return b.toString(16).padStart(2, '0');
+            }).join('');
+        }
+    }
+});
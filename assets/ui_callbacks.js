@@ -0,0 +1,39 @@
+// Browser versions of the callbacks that only toggle parts of the UI. Each
+// one matches the Python function of the same name (in snake case) in app.py,
+// which is used instead when clientside callbacks are turned off.
+function lingoIsBlank(value) {
+    return value === null || value === undefined || value.trim().length === 0;
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    lingo_ui: {
+        showLoginButton: function (displayName) {
+            return !lingoIsBlank(displayName);
+        },
+        showLogoutButton: function (displayName) {
+            return lingoIsBlank(displayName);
+        },
+        updateDisplayedTeam: function (teamName) {
+            if (!lingoIsBlank(teamName)) {
+                return [
+                    'Current Team: ' + teamName,
+                    {'border': '1px solid #007bff', 'borderRadius': '8px', 'padding': '0px',
+                     'margin': '0px', 'fontSize': '14px'}
+                ];
+            }
+            return ['What??', {'display': 'none'}];
+        },
+        fillExportForm: function (apiToken, teamId) {
+            return [apiToken, teamId];
+        },
+        updateSubmitWordButton: function (wordInput) {
+            return lingoIsBlank(wordInput);
+        },
+        updateSubmitMeaningButton: function (wordValue, meaningInput) {
+            return wordValue === null || wordValue === undefined || wordValue === 0 || lingoIsBlank(meaningInput);
+        },
+        updateSubmitReflectionButton: function (wordValue, reflectionInput) {
+            return wordValue === null || wordValue === undefined || wordValue === 0 || lingoIsBlank(reflectionInput);
+        }
+    }
+});
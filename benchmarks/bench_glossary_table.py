@@ -0,0 +1,43 @@
+"""Compare the glossary table sent for a whole team with a single page of it.
+
+Run from the top of the repository with ``python -m benchmarks.bench_glossary_table``.
+For each glossary size it reports how long it takes to build and serialize
+the table component, and how many bytes end up in the callback response.
+"""
+import time
+
+from dash._utils import to_json
+
+from app import render_words_table, sort_words, paginate, default_glossary_page_size
+
+glossary_sizes = [100, 1000, 5000, 20000]
+repeats = 5
+
+
+def make_words(count):
+    return [{'id': i, 'word': f"term-{i:06d}", 'created_at': f"2025-01-01T00:00:{i % 60:02d}"}
+            for i in range(count)]
+
+
+def measure(build):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        payload = to_json(build())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, len(payload)
+
+
+def main():
+    print(f"{'words':>8} {'full ms':>10} {'full bytes':>12} {'page ms':>10} {'page bytes':>12}")
+    for size in glossary_sizes:
+        words = make_words(size)
+        full_ms, full_bytes = measure(lambda: render_words_table(words))
+        page_ms, page_bytes = measure(
+            lambda: render_words_table(paginate(sort_words(words, 'word-asc'), 0, default_glossary_page_size)[0]))
+        print(f"{size:>8} {full_ms:>10.1f} {full_bytes:>12} {page_ms:>10.1f} {page_bytes:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Compare building tables through pandas with building them from records.
+
+Run from the top of the repository with ``python -m benchmarks.bench_table_builders``.
+The first part times the work a callback does to turn a list of meanings
+into a table, both the old way (a DataFrame and dbc.Table.from_dataframe)
+and with records_table. The second part starts fresh interpreters to
+measure the time and memory it takes to import the app, with and without
+pandas also being loaded.
+"""
+import subprocess
+import sys
+import time
+
+import dash_bootstrap_components as dbc
+
+from app import records_table, meaning_columns
+
+record_counts = [10, 100, 1000]
+repeats = 20
+cold_starts = 5
+
+# The peak RSS is read from /proc rather than getrusage, because Linux keeps
+# ru_maxrss across exec and the children would report this process's peak
+cold_start_script = """
+import time
+start = time.perf_counter()
+{preload}
+import app
+elapsed = time.perf_counter() - start
+status = dict(line.split(':', 1) for line in open('/proc/self/status'))
+print(elapsed, status['VmHWM'].split()[0])
+"""
+
+
+def make_meanings(count):
+    return [{'id': i, 'meaning': f"meaning number {i}", 'created_at': f"2025-01-01T00:00:{i % 60:02d}",
+             'word_id': 1, 'user_id': 1} for i in range(count)]
+
+
+def with_pandas(meanings):
+    import pandas as pd
+    df = pd.DataFrame(meanings)
+    df = df[['meaning', 'created_at']].rename(columns={'meaning': 'Meaning', 'created_at': 'Created At'})
+    return dbc.Table.from_dataframe(df, striped=True, bordered=True, hover=True)
+
+
+def records_table_for(meanings):
+    return records_table(meanings, meaning_columns)
+
+
+def cpu_ms(build, meanings):
+    start = time.process_time()
+    for _ in range(repeats):
+        build(meanings)
+    return (time.process_time() - start) / repeats * 1000
+
+
+def cold_start(preload):
+    times, rss = [], []
+    for _ in range(cold_starts):
+        output = subprocess.run([sys.executable, "-c", cold_start_script.format(preload=preload)],
+                                check=True, capture_output=True, text=True).stdout
+        elapsed, max_rss = output.split()
+        times.append(float(elapsed))
+        rss.append(int(max_rss))
+    return min(times) * 1000, min(rss) / 1024
+
+
+def main():
+    with_pandas(make_meanings(1))  # Don't count importing pandas in the first timing
+    print(f"{'records':>8} {'pandas cpu ms':>14} {'records cpu ms':>15}")
+    for count in record_counts:
+        meanings = make_meanings(count)
+        print(f"{count:>8} {cpu_ms(with_pandas, meanings):>14.2f} {cpu_ms(records_table_for, meanings):>15.2f}")
+
+    print()
+    print(f"{'worker start':<22} {'import ms':>10} {'max rss MB':>11}")
+    for label, preload in [("app only", ""), ("app with pandas", "import pandas")]:
+        elapsed_ms, rss_mb = cold_start(preload)
+        print(f"{label:<22} {elapsed_ms:>10.0f} {rss_mb:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Count the requests to the server that a typing session causes.
+
+Run from the top of the repository with ``python -m benchmarks.bench_typing_roundtrips``.
+Every keystroke in an input changes its value, and each server-side
+callback listening to that value is a POST to ``/_dash-update-component``.
+The app is loaded once with clientside callbacks and once without, and the
+callback graph of each is used to count the requests for the same session.
+"""
+import json
+import os
+import subprocess
+import sys
+
+# A user adding one word, then one meaning and one reflection for it
+typing_session = [
+    ('word-input.value', len("interdisciplinary")),
+    ('meaning-input.value', len("A boundary object shared between fields, read differently by each.")),
+    ('reflection-input.value', len("Our ecologists and economists disagreed about what counts as a cost, "
+                                   "and writing it down made the disagreement concrete.")),
+]
+
+count_script = """
+import json
+import app
+server_callbacks = [c for c in app.app._callback_list if not c.get('clientside_function')]
+listeners = {}
+for callback in server_callbacks:
+    for dependency in callback['inputs']:
+        key = dependency['id'] + '.' + dependency['property']
+        listeners[key] = listeners.get(key, 0) + 1
+print(json.dumps(listeners))
+"""
+
+
+def server_listeners(clientside):
+    environment = dict(os.environ, CLIENTSIDE_CALLBACKS="on" if clientside else "off")
+    output = subprocess.run([sys.executable, "-c", count_script], env=environment, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def requests_for_session(listeners):
+    return sum(keystrokes * listeners.get(prop, 0) for prop, keystrokes in typing_session)
+
+
+def main():
+    keystrokes = sum(count for _, count in typing_session)
+    before = requests_for_session(server_listeners(clientside=False))
+    after = requests_for_session(server_listeners(clientside=True))
+    print(f"keystrokes in session:             {keystrokes}")
+    print(f"server requests, server callbacks: {before}")
+    print(f"server requests, clientside:       {after}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Compare how many concurrent sessions each gunicorn worker class can serve.
+
+Run from the top of the repository with ``python -m benchmarks.compare_workers``.
+For each worker class this starts the client under gunicorn against the
+fake API from ``benchmarks.fake_api``, then runs the sessions of
+``benchmarks.load_test`` at increasing numbers of concurrent sessions. It
+reports the throughput and p95 callback latency at each step, and the most
+sessions served with a p95 under ``--p95-limit`` seconds. The fake API's
+latency stands in for a real API server, so the workers spend their time
+waiting as they would in production. Each worker class is chosen through the
+same environment variables as in production (``WORKER_CLASS``,
+``WORKER_THREADS``, and ``WORKER_CONNECTIONS``), so the connection pools
+and fan-out threads the client sizes from them match what it would run with.
+"""
+import argparse
+
+from benchmarks.fake_api import add_arguments, start_fake_api
+from benchmarks.load_test import percentile, run_load, start_client
+
+def worker_settings(mode, workers, threads, connections):
+    settings = {"WORKER_CLASS": mode, "WORKERS": str(workers)}
+    if mode == "gthread":
+        settings["WORKER_THREADS"] = str(threads)
+    elif mode == "gevent":
+        settings["WORKER_CONNECTIONS"] = str(connections)
+    return settings
+
+
+def measure(target, sessions, iterations):
+    stats, elapsed = run_load(target, sessions, iterations)
+    timings = sorted(t for times in stats.timings.values() for t in times)
+    failures = sum(stats.failures.values())
+    return len(timings) / elapsed, percentile(timings, 0.95), failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", default="sync,gthread,gevent",
+                        help="worker classes to compare (default sync,gthread,gevent)")
+    parser.add_argument("--sessions", default="4,8,16,32,64",
+                        help="numbers of concurrent sessions to try (default 4,8,16,32,64)")
+    parser.add_argument("--iterations", type=int, default=2, help="visits made by each session (default 2)")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers for the client (default 4)")
+    parser.add_argument("--threads", type=int, default=8, help="threads per gthread worker (default 8)")
+    parser.add_argument("--connections", type=int, default=100,
+                        help="green threads per gevent worker (default 100)")
+    parser.add_argument("--p95-limit", type=float, default=1.0,
+                        help="p95 callback latency, in seconds, a number of sessions must stay under (default 1)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    session_counts = [int(count) for count in args.sessions.split(',')]
+    modes = args.modes.split(',')
+    for mode in modes:
+        if mode not in ("sync", "gthread", "gevent"):
+            parser.error(f"unknown worker class: {mode}")
+
+    api = start_fake_api(0, args.latency, args.jitter, args.teams, args.words, args.items)
+    api_url = f"http://127.0.0.1:{api.server_address[1]}"
+    served = {}
+    try:
+        print(f"{'workers':<8} {'sessions':>8} {'per second':>10} {'p95 ms':>8} {'failed':>6}")
+        for mode in modes:
+            client, target = start_client(
+                api_url, worker_settings(mode, args.workers, args.threads, args.connections))
+            served[mode] = 0
+            try:
+                for sessions in session_counts:
+                    throughput, p95, failures = measure(target, sessions, args.iterations)
+                    print(f"{mode:<8} {sessions:>8} {throughput:>10.1f} {p95 * 1000:>8.1f} {failures:>6}")
+                    if p95 > args.p95_limit or failures:
+                        break
+                    served[mode] = sessions
+            finally:
+                client.terminate()
+                client.wait()
+    finally:
+        api.shutdown()
+
+    print()
+    print(f"Most concurrent sessions with a p95 under {args.p95_limit:g} s and no failures, "
+          f"with {args.workers} workers:")
+    for mode, sessions in served.items():
+        print(f"  {mode:<8} {sessions if sessions else f'fewer than {session_counts[0]}'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""A local stand-in for the LINGO API server, for load testing the client.
+
+Run from the top of the repository with ``python -m benchmarks.fake_api``,
+then start the client with ``API_SERVER_URL`` pointing at it. Every endpoint
+the client calls is served from an in-memory dataset, after waiting for the
+configured latency. Tokens are the ones made by ``benchmarks.token_stub``.
+Word, meaning, and reflection lists carry ETags, so the client's
+conditional requests behave as they would against the real server.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.token_stub import user_for_token
+
+epoch = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def timestamp(seconds):
+    return (epoch + timedelta(seconds=seconds)).isoformat()
+
+
+class Dataset:
+    """Teams, words, meanings, and reflections, shared by every user."""
+
+    def __init__(self, teams, words_per_team, items_per_word, owner_every=5):
+        self.lock = threading.Lock()
+        self.owner_every = owner_every
+        self.teams = {team_id: f"Team {team_id}" for team_id in range(1, teams + 1)}
+        self.words = {team_id: [] for team_id in self.teams}
+        self.word_teams = {}
+        self.meanings = {}
+        self.reflections = {}
+        self.current_teams = {}
+        self.next_id = 1
+        self.clock = 0
+        for team_id in self.teams:
+            for i in range(words_per_team):
+                word = self.add_word(team_id, f"word {team_id}-{i}")
+                for j in range(items_per_word):
+                    self.add_item(self.meanings, word['id'], 'meaning', f"meaning {j} of {word['word']}")
+                    self.add_item(self.reflections, word['id'], 'reflection', f"reflection {j} on {word['word']}")
+
+    def _new_id(self):
+        self.next_id += 1
+        self.clock += 1
+        return self.next_id - 1
+
+    def add_word(self, team_id, text):
+        word_id = self._new_id()
+        word = {'id': word_id, 'word': text, 'team_id': team_id, 'created_at': timestamp(self.clock)}
+        self.words[team_id].append(word)
+        self.word_teams[word_id] = team_id
+        self.meanings[word_id] = []
+        self.reflections[word_id] = []
+        return word
+
+    def add_item(self, items, word_id, field, text):
+        item = {'id': self._new_id(), field: text, 'word_id': word_id, 'user_id': 1,
+                'created_at': timestamp(self.clock)}
+        items[word_id].append(item)
+        return item
+
+    def user_info(self, user):
+        current_team_id = self.current_teams.get(user['id'], (user['id'] - 1) % len(self.teams) + 1)
+        return {'id': user['id'], 'email': user['email'], 'first_name': user['first_name'],
+                'last_name': user['last_name'], 'current_team_id': current_team_id, 'is_admin': False}
+
+    def is_owner(self, user):
+        return user['id'] % self.owner_every == 0
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    routes = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def dispatch(self, method):
+        server = self.server
+        time.sleep(max(0.0, random.gauss(server.latency, server.jitter)))
+        user = user_for_token(self.headers.get("Authorization", "").removeprefix("Bearer "))
+        if user is None:
+            return self.send_json(401, {'detail': 'Not authenticated'})
+        body = None
+        if method == "POST":
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(self.path)
+            if route_method == method and match:
+                with server.dataset.lock:
+                    status, data = handler(server.dataset, user, body, *[int(g) for g in match.groups()])
+                return self.send_json(status, data, etag=method == "GET")
+        self.send_json(404, {'detail': 'Not found'})
+
+    def send_json(self, status, data, etag=False):
+        body = json.dumps(data).encode()
+        headers = {"Content-Type": "application/json"}
+        if etag and status == 200:
+            headers["ETag"] = f'"{hashlib.sha1(body).hexdigest()}"'
+            if self.headers.get("If-None-Match") == headers["ETag"]:
+                status, body = 304, b""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def route(method, pattern):
+    def register(handler):
+        FakeApiHandler.routes.append((method, re.compile(f"^{pattern}$"), handler))
+        return handler
+    return register
+
+
+@route("GET", "/api/my/userinfo")
+def get_user_info(dataset, user, body):
+    return 200, dataset.user_info(user)
+
+
+@route("GET", "/api/my/team-membership")
+def get_team_membership(dataset, user, body):
+    return 200, {'team_id': dataset.user_info(user)['current_team_id'], 'is_owner': dataset.is_owner(user)}
+
+
+@route("GET", "/api/my/teams")
+def get_my_teams(dataset, user, body):
+    return 200, [{'id': team_id, 'team_name': name} for team_id, name in dataset.teams.items()]
+
+
+@route("POST", "/api/my/teams")
+def set_current_team(dataset, user, body):
+    if body.get('current_team_id') not in dataset.teams:
+        return 404, {'detail': 'Team not found'}
+    dataset.current_teams[user['id']] = body['current_team_id']
+    return 200, dataset.user_info(user)
+
+
+@route("GET", r"/api/teams/(\d+)")
+def get_team(dataset, user, body, team_id):
+    if team_id not in dataset.teams:
+        return 404, {'detail': 'Team not found'}
+    return 200, {'id': team_id, 'team_name': dataset.teams[team_id]}
+
+
+@route("GET", r"/api/teams/(\d+)/users")
+def get_team_users(dataset, user, body, team_id):
+    return 200, [{'id': i, 'first_name': f"First{i}", 'last_name': f"Last{i}", 'email': f"user{i}@example.com"}
+                 for i in range(1, 11)]
+
+
+@route("GET", r"/api/teams/(\d+)/words")
+def get_words(dataset, user, body, team_id):
+    if team_id not in dataset.words:
+        return 404, {'detail': 'Team not found'}
+    return 200, dataset.words[team_id]
+
+
+@route("POST", "/api/words")
+def post_word(dataset, user, body):
+    if body.get('team_id') not in dataset.words:
+        return 404, {'detail': 'Team not found'}
+    return 200, dataset.add_word(body['team_id'], body['word'])
+
+
+@route("GET", r"/api/words/(\d+)/meanings")
+def get_meanings(dataset, user, body, word_id):
+    if word_id not in dataset.meanings:
+        return 404, {'detail': 'Word not found'}
+    return 200, dataset.meanings[word_id]
+
+
+@route("POST", r"/api/words/(\d+)/meanings")
+def post_meaning(dataset, user, body, word_id):
+    if word_id not in dataset.meanings:
+        return 404, {'detail': 'Word not found'}
+    return 200, dataset.add_item(dataset.meanings, word_id, 'meaning', body['meaning'])
+
+
+@route("GET", r"/api/words/(\d+)/reflections")
+def get_reflections(dataset, user, body, word_id):
+    if word_id not in dataset.reflections:
+        return 404, {'detail': 'Word not found'}
+    return 200, dataset.reflections[word_id]
+
+
+@route("POST", r"/api/words/(\d+)/reflections")
+def post_reflection(dataset, user, body, word_id):
+    if word_id not in dataset.reflections:
+        return 404, {'detail': 'Word not found'}
+    return 200, dataset.add_item(dataset.reflections, word_id, 'reflection', body['reflection'])
+
+
+def start_fake_api(port=0, latency=0.05, jitter=0.0, teams=5, words_per_team=200, items_per_word=3):
+    """Start the fake API on a background thread and return the server.
+
+    Its address is server.server_address. Call server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeApiHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.jitter = jitter
+    server.dataset = Dataset(teams, words_per_team, items_per_word)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds each request waits (default 0.05)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of the latency")
+    parser.add_argument("--teams", type=int, default=5, help="number of teams (default 5)")
+    parser.add_argument("--words", type=int, default=200, help="words per team (default 200)")
+    parser.add_argument("--items", type=int, default=3,
+                        help="meanings and reflections per word (default 3)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = start_fake_api(args.port, args.latency, args.jitter, args.teams, args.words, args.items)
+    print(f"Fake LINGO API listening on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
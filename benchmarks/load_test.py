@@ -0,0 +1,281 @@
+"""Drive the client with many concurrent sessions and report callback latencies.
+
+Run from the top of the repository with ``python -m benchmarks.load_test``.
+By default this starts the fake API from ``benchmarks.fake_api`` and the
+client under gunicorn pointed at it. Each simulated session then logs in
+with a stub token and repeats the same visit: the glossary, adding a word,
+a word on the reflections page with a meaning and a reflection added, and
+the teams page. Each callback is a POST to ``/_dash-update-component``,
+built from the app's own ``/_dash-dependencies`` the way the browser does.
+
+The client started here reads its settings, such as ``WORKER_CLASS``, from
+the environment like it does anywhere else, so
+``WORKER_CLASS=gthread python -m benchmarks.load_test`` loads gthread workers.
+
+Use ``--target`` to load a client that is already running. It has to be
+using the fake API, since the fake API is the only thing that accepts the
+stub tokens.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import requests
+
+from benchmarks.fake_api import add_arguments, start_fake_api
+from benchmarks.token_stub import login_props
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def split_outputs(output):
+    # "..a.children...b.data.." for several outputs, "a.children" for one
+    if output.startswith('..'):
+        parts = output[2:-2].split('...')
+    else:
+        parts = [output]
+    outputs = []
+    for part in parts:
+        component_id, prop = part.rsplit('.', 1)
+        outputs.append({'id': component_id, 'property': prop})
+    return outputs
+
+
+class Callbacks:
+    """The server-side callbacks of the app, found by one of their outputs."""
+
+    def __init__(self, dependencies):
+        self.by_output = defaultdict(list)
+        for dependency in dependencies:
+            if dependency.get('clientside_function') or dependency['output'].startswith('..{'):
+                continue
+            dependency['outputs'] = split_outputs(dependency['output'])
+            for output in dependency['outputs']:
+                self.by_output[f"{output['id']}.{output['property']}"].append(dependency)
+
+    def find(self, output):
+        # When callbacks share an output with allow_duplicate, all but one
+        # of them name it with an @ suffix, so this finds that one
+        matches = self.by_output.get(output)
+        if not matches:
+            raise KeyError(f"No server-side callback outputs {output}")
+        return matches[0]
+
+
+class Session:
+    """One simulated browser tab, keeping the property values it has seen."""
+
+    def __init__(self, target, callbacks, user_id, stats):
+        self.target = target
+        self.callbacks = callbacks
+        self.stats = stats
+        self.http = requests.Session()
+        self.props = dict(login_props(user_id))
+        self.props['user-logged-in.data'] = self.props['firebase_auth.userDisplayName']
+        self.props['session-id.data'] = uuid.uuid4().hex
+        self.props['url.pathname'] = '/'
+        self.props['url.search'] = ''
+
+    def call(self, name, output, changed=()):
+        dependency = self.callbacks.find(output)
+
+        def values(dependencies):
+            return [dict(d, value=self.props.get(f"{d['id']}.{d['property']}")) for d in dependencies]
+
+        outputs = dependency['outputs']
+        body = {
+            'output': dependency['output'],
+            'outputs': outputs if len(outputs) > 1 or dependency['output'].startswith('..') else outputs[0],
+            'inputs': values(dependency['inputs']),
+            'state': values(dependency['state']),
+            'changedPropIds': list(changed),
+        }
+        started = time.perf_counter()
+        try:
+            response = self.http.post(f"{self.target}/_dash-update-component", json=body, timeout=60)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, 'error'
+        self.stats.record(name, time.perf_counter() - started, status)
+        if status == 200:
+            for component_id, props in response.json().get('response', {}).items():
+                for prop, value in props.items():
+                    if isinstance(value, dict) and '__dash_patch_update' in value:
+                        continue
+                    self.props[f"{component_id}.{prop}"] = value
+                    self.collect(value)
+
+    def collect(self, value):
+        # Pick up the initial properties of components a callback rendered,
+        # as the browser does when it adds them to the page
+        if isinstance(value, list):
+            for child in value:
+                self.collect(child)
+        elif isinstance(value, dict) and 'props' in value:
+            props = value['props']
+            if isinstance(props.get('id'), str):
+                for prop, prop_value in props.items():
+                    if prop != 'children':
+                        self.props[f"{props['id']}.{prop}"] = prop_value
+            self.collect(props.get('children'))
+
+    def navigate(self, pathname, search=''):
+        self.props['url.pathname'] = pathname
+        self.props['url.search'] = search
+        self.call('update_page_content', 'page-content.children', ['url.pathname'])
+
+    def run(self, iteration):
+        if iteration == 0:
+            self.call('update_user_info', 'session-bootstrap.data', ['firebase_auth.apiToken'])
+            self.call('show_left_nav', 'left-nav.children')
+
+        self.navigate('/glossary')
+        self.call('update_words', 'word-content.children')
+        self.props['word-input.value'] = f"load word {uuid.uuid4().hex[:8]}"
+        self.props['submit-word.n_clicks'] = (self.props.get('submit-word.n_clicks') or 0) + 1
+        self.call('submit_word', 'word-input.value', ['submit-word.n_clicks'])
+
+        word_id = self.first_word_id(self.props.get('word-content.children'))
+        self.navigate('/reflections', f"?word={word_id}" if word_id else '')
+        self.call('update_word_options', 'word-dropdown.options')
+        self.call('update_word_details', 'meaning-content.children')
+        if self.props.get('word-dropdown.value'):
+            self.props['meaning-input.value'] = "a meaning added under load"
+            self.props['submit-meaning.n_clicks'] = (self.props.get('submit-meaning.n_clicks') or 0) + 1
+            self.call('submit_meaning', 'meaning-input.value', ['submit-meaning.n_clicks'])
+            self.props['reflection-input.value'] = "a reflection added under load"
+            self.props['submit-reflection.n_clicks'] = (self.props.get('submit-reflection.n_clicks') or 0) + 1
+            self.call('submit_reflection', 'reflection-input.value', ['submit-reflection.n_clicks'])
+
+        self.navigate('/teams')
+        self.call('update_teams_grid', 'teams-grid.children')
+        self.call('update_team_members', 'team-member-content.children')
+
+    def first_word_id(self, table):
+        # The glossary links each word to the reflections page with ?word=<id>
+        found = []
+
+        def walk(value):
+            if found:
+                return
+            if isinstance(value, list):
+                for child in value:
+                    walk(child)
+            elif isinstance(value, dict) and 'props' in value:
+                href = value['props'].get('href')
+                if isinstance(href, str) and 'word=' in href:
+                    found.append(int(href.split('word=')[1].split('&')[0]))
+                walk(value['props'].get('children'))
+
+        walk(table)
+        return found[0] if found else None
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = defaultdict(list)
+        self.failures = defaultdict(int)
+
+    def record(self, name, seconds, status):
+        with self.lock:
+            self.timings[name].append(seconds)
+            if status not in (200, 204):
+                self.failures[name] += 1
+
+    def report(self, elapsed):
+        total = sum(len(t) for t in self.timings.values())
+        print(f"{total} callbacks in {elapsed:.1f} s, {total / elapsed:.1f} per second")
+        print()
+        print(f"{'callback':<22} {'count':>6} {'failed':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for name, timings in self.timings.items():
+            timings = sorted(timings)
+            print(f"{name:<22} {len(timings):>6} {self.failures[name]:>6} "
+                  f"{percentile(timings, 0.50) * 1000:>8.1f} {percentile(timings, 0.95) * 1000:>8.1f} "
+                  f"{percentile(timings, 0.99) * 1000:>8.1f}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_client(api_url, settings=None):
+    # Worker settings go through the environment rather than gunicorn's
+    # command line, so config.py sizes its pools and streams for them too
+    port = free_port()
+    environment = dict(os.environ, API_SERVER_URL=api_url, **(settings or {}))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "wsgi:app", "--bind", f"127.0.0.1:{port}",
+         "--log-level", "warning"],
+        env=environment, stdout=subprocess.DEVNULL)
+    target = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{target}/_dash-dependencies", timeout=1)
+            return process, target
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("The client didn't start within 60 seconds")
+
+
+def run_load(target, sessions, iterations):
+    callbacks = Callbacks(requests.get(f"{target}/_dash-dependencies", timeout=10).json())
+    stats = Stats()
+
+    def run_session(user_id):
+        session = Session(target, callbacks, user_id, stats)
+        for iteration in range(iterations):
+            session.run(iteration)
+
+    threads = [threading.Thread(target=run_session, args=(user_id,)) for user_id in range(1, sessions + 1)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent sessions (default 20)")
+    parser.add_argument("--iterations", type=int, default=5, help="visits made by each session (default 5)")
+    parser.add_argument("--workers", type=int, help="gunicorn workers for the client (default WORKERS)")
+    parser.add_argument("--target", help="URL of a client that is already running against the fake API")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    api, client = None, None
+    target = args.target
+    if target is None:
+        api = start_fake_api(0, args.latency, args.jitter, args.teams, args.words, args.items)
+        settings = {"WORKERS": str(args.workers)} if args.workers else {}
+        client, target = start_client(f"http://127.0.0.1:{api.server_address[1]}", settings)
+    try:
+        stats, elapsed = run_load(target.rstrip('/'), args.sessions, args.iterations)
+        stats.report(elapsed)
+    finally:
+        if client is not None:
+            client.terminate()
+            client.wait()
+        if api is not None:
+            api.shutdown()
+
+
+if __name__ == '__main__':
+    main()
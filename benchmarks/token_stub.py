@@ -0,0 +1,57 @@
+"""Stand-ins for the Firebase ID tokens and profile the login component provides.
+
+The tokens have the shape of a Firebase ID token (a JWT), but are unsigned,
+so only the fake API in ``benchmarks.fake_api`` accepts them. They expire an
+hour after they are made, like the real ones.
+"""
+import base64
+import json
+import time
+
+token_lifetime = 3600
+
+
+def _encode(part):
+    return base64.urlsafe_b64encode(json.dumps(part, separators=(',', ':')).encode()).rstrip(b'=').decode()
+
+
+def _decode(part):
+    return json.loads(base64.urlsafe_b64decode(part + '=' * (-len(part) % 4)))
+
+
+def make_token(user_id, now=None):
+    now = int(now if now is not None else time.time())
+    claims = {
+        'iss': 'https://securetoken.google.com/lingo-load-test',
+        'aud': 'lingo-load-test',
+        'sub': f"load-user-{user_id}",
+        'user_id': user_id,
+        'email': f"load-user-{user_id}@example.com",
+        'name': f"Load User {user_id}",
+        'iat': now,
+        'exp': now + token_lifetime,
+    }
+    return f"{_encode({'alg': 'none', 'typ': 'JWT'})}.{_encode(claims)}."
+
+
+def user_for_token(token):
+    """Return the user a stub token was made for, or None if it isn't a valid one."""
+    try:
+        _, claims, _ = token.split('.')
+        claims = _decode(claims)
+        user_id, email, expires_at = claims['user_id'], claims['email'], claims['exp']
+    except (ValueError, KeyError, TypeError):
+        return None
+    if expires_at < time.time():
+        return None
+    return {'id': user_id, 'email': email, 'first_name': 'Load', 'last_name': f"User {user_id}"}
+
+
+def login_props(user_id):
+    """The properties the firebase_auth component has once this user is logged in."""
+    return {
+        'firebase_auth.apiToken': make_token(user_id),
+        'firebase_auth.userDisplayName': f"Load User {user_id}",
+        'firebase_auth.userEmail': f"load-user-{user_id}@example.com",
+        'firebase_auth.userPhotoUrl': None,
+    }
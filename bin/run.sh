@@ -1,3 +1,11 @@
 #!/usr/bin/env bash
 
-gunicorn wsgi:app --bind 0.0.0.0:8050 --log-level=debug --workers=4
\ No newline at end of file
+# Each worker writes its metrics here, so /metrics can add them all up. It is
+# emptied first so numbers from an earlier run aren't counted again.
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/lingo-metrics}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# The worker class and number of workers are set in gunicorn.conf.py from
+# WORKER_CLASS, WORKERS, and the other settings described in the README
+gunicorn wsgi:app --bind 0.0.0.0:8050 --log-level=debug
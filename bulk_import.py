@@ -0,0 +1,187 @@
+from config import import_workers, import_rate_limit, import_retries, import_max_rows, import_time_limit
+from api import create_word, create_meaning, create_reflection
+import base64
+import csv
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Statuses that mean the API server turned a request away without adding
+# anything, so it is safe to send again after a pause. Other failures, such
+# as a 502 or a timeout, may come after the item was added, so sending it
+# again could add it twice. Requests that never reached the API server are
+# tried again by the API layer itself.
+retry_statuses = {429, 503}
+
+not_imported = "Not imported: the import ran out of time. Upload this row again to add it."
+
+
+class RateLimiter:
+    """Spaces out calls from any number of threads to at most rate per second."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if self.interval == 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_until = max(now, self.next_time)
+            self.next_time = wait_until + self.interval
+        time.sleep(max(0.0, wait_until - now))
+
+
+def parse_upload(contents, filename):
+    """Turn an uploaded CSV or JSON file into rows of word, meaning, and reflection.
+
+    CSV files need a header with a word column, and may have meaning and
+    reflection columns. JSON files hold a list of words, or of objects with
+    those keys. Raises ValueError with a message for the user if the file
+    can't be read.
+    """
+    try:
+        data = base64.b64decode(contents.split(',', 1)[1]).decode('utf-8-sig')
+    except (IndexError, ValueError):
+        raise ValueError("The file could not be read as UTF-8 text")
+
+    if filename.lower().endswith('.json'):
+        try:
+            records = json.loads(data)
+        except ValueError as e:
+            raise ValueError(f"The file is not valid JSON: {e}")
+        if not isinstance(records, list):
+            raise ValueError("A JSON file must hold a list of words")
+        records = [{'word': record} if isinstance(record, str) else record for record in records]
+        if not all(isinstance(record, dict) for record in records):
+            raise ValueError("Each entry in a JSON file must be a word or an object with a word")
+    elif filename.lower().endswith('.csv'):
+        reader = csv.DictReader(io.StringIO(data))
+        if reader.fieldnames is None or 'word' not in [name.strip().lower() for name in reader.fieldnames]:
+            raise ValueError("A CSV file needs a header row with a word column")
+        records = [{(key or '').strip().lower(): value for key, value in record.items()} for record in reader]
+    else:
+        raise ValueError("Only .csv and .json files can be imported")
+
+    if len(records) > import_max_rows:
+        raise ValueError(f"A file can have at most {import_max_rows} rows")
+
+    def text(value):
+        return value.strip() if isinstance(value, str) and value.strip() else None
+
+    return [{'row': number, 'word': text(record.get('word')), 'meaning': text(record.get('meaning')),
+             'reflection': text(record.get('reflection'))}
+            for number, record in enumerate(records, start=1)]
+
+
+def _submit(limiter, deadline, create, *args):
+    # Calls the API through the rate limiter, backing off and trying again
+    # when the API server was too busy, as long as there is time left
+    response = None
+    for attempt in range(import_retries + 1):
+        limiter.wait()
+        response = create(*args, retries=import_retries)
+        if response is None or response.status_code not in retry_statuses:
+            return response
+        if attempt < import_retries:
+            retry_after = response.headers.get('Retry-After')
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else 0.5 * 2 ** attempt
+            if time.monotonic() + delay > deadline:
+                break
+            time.sleep(delay)
+    return response
+
+
+def _succeeded(response):
+    return response is not None and response.status_code in (200, 201)
+
+
+def _failure(response):
+    if response is None:
+        return "Failed: the API server didn't answer, so this may or may not have been added"
+    return f"Failed: {response.status_code} {response.text[:200]}"
+
+
+def _created(response):
+    try:
+        item = response.json()
+    except ValueError:
+        return None
+    return item if isinstance(item, dict) and 'id' in item else None
+
+
+def _import_word(limiter, deadline, api_token, team_id, word, word_id, rows, results):
+    new_word = None
+    created = word_id is None
+    if time.monotonic() > deadline:
+        for row in rows:
+            results[row['row']] = not_imported
+        return None
+    if created:
+        response = _submit(limiter, deadline, create_word, api_token, team_id, word)
+        if not _succeeded(response):
+            for row in rows:
+                results[row['row']] = _failure(response)
+            return None
+        new_word = _created(response)
+        word_id = new_word['id'] if new_word is not None else None
+
+    for row in rows:
+        if row is not rows[0] and time.monotonic() > deadline:
+            results[row['row']] = not_imported
+            continue
+        added = ['word'] if created and row is rows[0] else []
+        for field, create in (('meaning', create_meaning), ('reflection', create_reflection)):
+            if row[field] is None:
+                continue
+            if word_id is None:
+                results[row['row']] = f"Failed: the word was added, but not the {field}, as its id wasn't returned"
+                break
+            response = _submit(limiter, deadline, create, api_token, word_id, row[field])
+            if not _succeeded(response):
+                results[row['row']] = _failure(response)
+                break
+            added.append(field)
+        else:
+            results[row['row']] = f"Added {', '.join(added)}" if added else "Skipped: the word already exists"
+    return new_word
+
+
+def import_rows(api_token, team_id, rows, existing_words):
+    """Add rows of words, meanings, and reflections to a team.
+
+    Rows for words the team already has only add their meaning and
+    reflection. Rows repeated in the file are skipped. Each word's rows are
+    sent in order, but different words are sent side by side on a pool of
+    import_workers threads, at most import_rate_limit requests a second.
+    No new rows are started after import_time_limit seconds; the rows left
+    are marked as not imported, so they can be uploaded again.
+    Returns a result for every row, by row number, and the new words.
+    """
+    existing = {word['word'].strip().casefold(): word['id'] for word in existing_words or []}
+    results = {}
+    groups = {}
+    seen = set()
+    for row in rows:
+        if row['word'] is None:
+            results[row['row']] = "Skipped: the row has no word"
+            continue
+        key = row['word'].casefold()
+        if (key, row['meaning'], row['reflection']) in seen:
+            results[row['row']] = "Skipped: the same row is earlier in the file"
+            continue
+        seen.add((key, row['meaning'], row['reflection']))
+        groups.setdefault(key, []).append(row)
+
+    limiter = RateLimiter(import_rate_limit)
+    deadline = time.monotonic() + import_time_limit
+    with ThreadPoolExecutor(max_workers=import_workers, thread_name_prefix="lingo-import") as executor:
+        futures = [executor.submit(_import_word, limiter, deadline, api_token, team_id, group[0]['word'],
+                                   existing.get(key), group, results)
+                   for key, group in groups.items()]
+        new_words = [future.result() for future in futures]
+    return results, [word for word in new_words if word is not None]
@@ -0,0 +1,146 @@
+from config import cache_backend, cache_path
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """A bounded, thread-safe, in-process cache whose entries expire."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            # Keep the most recently used entries at the end, so the
+            # least recently used ones are the first to be evicted
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SqliteCache:
+    """A cache kept in a SQLite file, so it is shared by every worker on a host.
+
+    Values must be JSON serializable. Each cache uses its own namespace in
+    the file, so several caches can share one database.
+    """
+
+    # Trimming the table back to max_size is only checked every few writes
+    trim_interval = 50
+
+    def __init__(self, path, namespace, max_size, ttl):
+        self.path = path
+        self.namespace = namespace
+        self.max_size = max_size
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, stored_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key))")
+
+    def _connect(self):
+        # SQLite connections can't be shared between threads or processes,
+        # so each thread of each worker opens its own
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        connection = self._connect()
+        row = connection.execute(
+            "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at < time.time():
+            self.delete(key)
+            return None
+        return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        connection = self._connect()
+        connection.execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, stored_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, key, json.dumps(value), now + self.ttl, now))
+        self._writes += 1
+        if self._writes % self.trim_interval == 0:
+            self._trim(connection, now)
+
+    def _trim(self, connection, now):
+        connection.execute("DELETE FROM cache_entries WHERE namespace = ? AND expires_at < ?",
+                           (self.namespace, now))
+        connection.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+            "SELECT key FROM cache_entries WHERE namespace = ? "
+            "ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_size))
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                                (self.namespace, key))
+
+    def delete_prefix(self, prefix):
+        self._connect().execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND substr(key, 1, ?) = ?",
+            (self.namespace, len(prefix), prefix))
+
+    def clear(self):
+        self._connect().execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+
+
+def create_cache(namespace, max_size, ttl, backend=None, path=None):
+    """Create a cache using the backend chosen in the configuration.
+
+    The backend and SQLite file can be given to use something other than
+    the configured CACHE_BACKEND and CACHE_PATH.
+    """
+    backend = backend or cache_backend
+    if backend == "sqlite":
+        return SqliteCache(path or cache_path, namespace, max_size, ttl)
+    if backend != "memory":
+        raise ValueError(f"Unknown cache backend: {backend}")
+    return TTLCache(max_size, ttl)
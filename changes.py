@@ -0,0 +1,89 @@
+from config import change_stream_enabled, change_stream_poll, change_stream_max_duration, change_stream_max_streams
+from cache import create_cache
+import json
+import threading
+import time
+
+# The newest created_at seen for anything in each team. This is only ever a
+# timestamp, never any team data, and it is what the change stream watches.
+# A stream has to see changes recorded by every worker, so with the stream
+# turned on this is always kept in the shared SQLite cache.
+_team_versions = create_cache("changes", 10000, 7 * 24 * 60 * 60,
+                              backend="sqlite" if change_stream_enabled else None)
+
+
+def latest_created_at(items):
+    stamps = [item['created_at'] for item in items or [] if item.get('created_at')]
+    return max(stamps) if stamps else None
+
+
+def items_since(items, since):
+    # Items created after the given created_at, or all of them if there is none
+    if since is None:
+        return list(items or [])
+    return [item for item in items or [] if item.get('created_at') and item['created_at'] > since]
+
+
+def team_version(team_id):
+    return _team_versions.get(str(team_id))
+
+
+def record_change(team_id, created_at):
+    if team_id is None or created_at is None:
+        return
+    current = team_version(team_id)
+    if current is None or created_at > current:
+        _team_versions.set(str(team_id), created_at)
+
+
+# Each stream holds a worker's thread or green thread for as long as it is
+# open, so a worker only holds so many at once
+_open_streams = threading.BoundedSemaphore(max(1, change_stream_max_streams))
+
+
+class _TeamStream:
+    # The response body of a stream. The WSGI server closes it when the
+    # stream ends or the browser goes away, which frees its place.
+    def __init__(self, team_id):
+        self.events = _team_events(team_id)
+        self.closed = False
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.events.close()
+            _open_streams.release()
+
+
+def stream_team_changes(team_id):
+    """Return server-sent events for whenever something new appears in a team.
+
+    Returns None if this worker already holds as many streams as it may.
+    The events only carry the team's new version. Browsers fetch the new
+    items themselves through the usual callbacks, with their own token.
+    The stream ends after a while, and the browser then reconnects.
+    """
+    if not _open_streams.acquire(blocking=False):
+        return None
+    return _TeamStream(team_id)
+
+
+def _team_events(team_id):
+    started = time.monotonic()
+    last_version = team_version(team_id)
+    last_sent = started
+    yield "retry: 5000\n\n"
+    while time.monotonic() - started < change_stream_max_duration:
+        time.sleep(change_stream_poll)
+        version = team_version(team_id)
+        if version != last_version:
+            last_version = version
+            last_sent = time.monotonic()
+            yield f"event: change\ndata: {json.dumps({'team_id': team_id, 'version': version})}\n\n"
+        elif time.monotonic() - last_sent > 15:
+            # Comments keep proxies from closing an idle connection
+            last_sent = time.monotonic()
+            yield ": keep-alive\n\n"
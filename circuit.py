@@ -0,0 +1,109 @@
+from config import (circuit_enabled, circuit_window, circuit_min_calls, circuit_failure_rate,
+                    circuit_slow_call, circuit_open_seconds)
+from metrics import endpoint_name, observe_circuit_state, observe_short_circuit
+import logging
+import threading
+import time
+from collections import deque
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half-open", "open"
+
+logger = logging.getLogger("lingo.circuit")
+
+
+class CircuitBreaker:
+    """Stops calling an endpoint of the API server for a while once it is failing.
+
+    The last window calls are remembered. A call fails if the API server
+    couldn't be reached, answered with a 5xx status, or took longer than
+    slow_call seconds. Once at least min_calls have been made and
+    failure_rate of them failed, the circuit opens, and calls are refused
+    straight away for open_seconds. After that one trial call is let
+    through: if it succeeds the circuit closes again, and if not it stays
+    open for another open_seconds.
+    """
+
+    def __init__(self, endpoint, method, window, min_calls, failure_rate, slow_call, open_seconds):
+        self.endpoint = endpoint
+        self.method = method
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.calls = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self._move_to(HALF_OPEN, "trying a call")
+            if self.state == HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return True
+        observe_short_circuit(self.endpoint, self.method)
+        return False
+
+    def record(self, failed):
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.trial_running = False
+                if failed:
+                    self._open("the trial call failed")
+                else:
+                    self.calls.clear()
+                    self._move_to(CLOSED, "the trial call succeeded")
+                return
+            if self.state == OPEN:
+                # A call that started before the circuit opened
+                return
+            self.calls.append(failed)
+            failures = sum(self.calls)
+            if len(self.calls) >= self.min_calls and failures >= self.failure_rate * len(self.calls):
+                self._open(f"{failures} of the last {len(self.calls)} calls failed or took longer than "
+                           f"{self.slow_call:g}s")
+
+    def _open(self, reason):
+        self.opened_at = time.monotonic()
+        self._move_to(OPEN, f"{reason}, refusing calls for {self.open_seconds:g}s")
+
+    def _move_to(self, state, reason):
+        self.state = state
+        level = logging.WARNING if state == OPEN else logging.INFO
+        logger.log(level, "API circuit for %s %s is now %s: %s", self.method, self.endpoint, state, reason)
+        observe_circuit_state(self.endpoint, self.method, state)
+
+
+# One breaker per method and endpoint (as named for the metrics) in each
+# worker process, so failing POSTs don't stop the GETs of the same list
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def _breaker(method, path):
+    key = (method, endpoint_name(path))
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(key)
+            if breaker is None:
+                breaker = _breakers[key] = CircuitBreaker(
+                    key[1], method, circuit_window, circuit_min_calls, circuit_failure_rate,
+                    circuit_slow_call, circuit_open_seconds)
+    return breaker
+
+
+def allow(method, path):
+    """Whether a method request to path may be sent to the API server now."""
+    return not circuit_enabled or _breaker(method, path).allow()
+
+
+def record(method, path, response, seconds):
+    """Record how a method request to path went. response is None if it failed."""
+    if circuit_enabled:
+        failed = response is None or response.status_code >= 500 or seconds > circuit_slow_call
+        _breaker(method, path).record(failed)
@@ -1,5 +1,23 @@
 from os import environ
 
+
+def get_setting(name, default):
+    value = environ.get(name)
+    if value:
+        value = value.strip()
+        if len(value) > 0:
+            return value
+    return default
+
+
+def get_int_setting(name, default):
+    return int(get_setting(name, default))
+
+
+def get_float_setting(name, default):
+    return float(get_setting(name, default))
+
+
 # Set the default for the API server endpiont
 api_server_url = "http://localhost:8000"
 
@@ -8,4 +26,142 @@ api_server_var = environ.get("API_SERVER_URL")
 if api_server_var:
     api_server_var = api_server_var.strip()
     if len(api_server_var) > 0:
-        api_server_url = api_server_var
\ No newline at end of file
+        api_server_url = api_server_var
+
+# How gunicorn serves the client (gunicorn.conf.py reads these). Sync workers
+# handle one callback at a time. Since callbacks spend most of their time
+# waiting on the API server, gthread workers, each running WORKER_THREADS
+# callbacks side by side, or gevent workers, each running up to
+# WORKER_CONNECTIONS on green threads, serve many more sessions.
+worker_class = get_setting("WORKER_CLASS", "sync")
+if worker_class not in ("sync", "gthread", "gevent"):
+    raise ValueError(f"Unknown worker class: {worker_class}")
+workers = get_int_setting("WORKERS", 4)
+worker_threads = get_int_setting("WORKER_THREADS", 8)
+worker_connections = get_int_setting("WORKER_CONNECTIONS", 100)
+worker_timeout = get_int_setting("WORKER_TIMEOUT", 30)
+worker_concurrency = {"sync": 1, "gthread": worker_threads, "gevent": worker_connections}[worker_class]
+
+# Size of the keep-alive connection pool each worker keeps open to the API
+# server, and how long (in seconds) we wait to connect and then for a response.
+# A callback may make two or three requests at once, so the pool grows with
+# the number of callbacks a worker runs at once.
+api_pool_size = get_int_setting("API_POOL_SIZE", max(10, 2 * worker_concurrency))
+api_connect_timeout = get_float_setting("API_CONNECT_TIMEOUT", 3.05)
+api_read_timeout = get_float_setting("API_READ_TIMEOUT", 10)
+
+# How many user info, team, and team membership lookups are cached per worker,
+# and for how many seconds each one is reused before asking the API server again
+identity_cache_size = get_int_setting("IDENTITY_CACHE_SIZE", 1000)
+identity_cache_ttl = get_float_setting("IDENTITY_CACHE_TTL", 300)
+
+# How many requests to the API server a worker will make at the same time
+# when a single callback needs several independent pieces of data. Like the
+# connection pool, this grows with the number of callbacks a worker runs at once.
+api_fanout_workers = get_int_setting("API_FANOUT_WORKERS", max(8, 2 * worker_concurrency))
+
+# How many word, meaning, and reflection lists are kept per worker so they can
+# be revalidated with conditional requests, and for how many seconds
+validation_cache_size = get_int_setting("VALIDATION_CACHE_SIZE", 2000)
+validation_cache_ttl = get_float_setting("VALIDATION_CACHE_TTL", 3600)
+
+# Where cached API responses are kept. "memory" keeps a separate cache in each
+# worker, while "sqlite" keeps one cache in a file shared by all the workers
+cache_backend = get_setting("CACHE_BACKEND", "memory").lower()
+cache_path = get_setting("CACHE_PATH", "/tmp/lingo-cache.sqlite3")
+
+# The search box keeps an index of each team's words, meanings, and
+# reflections in every worker. These set how many teams are kept, how often
+# (in seconds) the word list is checked for new words, and how many threads
+# load meanings and reflections into a new index in the background.
+search_index_max_teams = get_int_setting("SEARCH_INDEX_MAX_TEAMS", 50)
+search_index_refresh = get_float_setting("SEARCH_INDEX_REFRESH", 30)
+search_index_workers = get_int_setting("SEARCH_INDEX_WORKERS", 2)
+
+# How often (in seconds) open pages check for new words, meanings, and
+# reflections. When the change stream is turned on, pages are told about
+# changes as they happen, and the check only runs at the fallback interval.
+# Each open stream holds a connection, so it is best used with a cooperative
+# worker class rather than the default sync workers.
+change_poll_interval = get_int_setting("CHANGE_POLL_INTERVAL", 30)
+# A worker holds at most CHANGE_STREAM_MAX_STREAMS streams open at once, by
+# default half the callbacks it can run at once. That leaves sync workers
+# none, so with them the stream stays off and pages keep polling.
+change_stream_max_streams = get_int_setting("CHANGE_STREAM_MAX_STREAMS", worker_concurrency // 2)
+change_stream_enabled = (get_setting("CHANGE_STREAM", "off").lower() in ("1", "on", "true", "yes")
+                         and change_stream_max_streams > 0)
+change_stream_fallback_interval = get_int_setting("CHANGE_STREAM_FALLBACK_INTERVAL", 300)
+change_stream_poll = get_float_setting("CHANGE_STREAM_POLL", 1)
+change_stream_max_duration = get_float_setting("CHANGE_STREAM_MAX_DURATION", 600)
+
+# Whether callbacks that only show, hide, or enable parts of the page run in
+# the browser. Turning this off runs them on the server, as they used to be.
+clientside_callbacks_enabled = get_setting("CLIENTSIDE_CALLBACKS", "on").lower() in ("1", "on", "true", "yes")
+
+# Data fetched for each browser session is kept on the server, so callbacks
+# can reuse it instead of asking the API server again. "memory" keeps it in
+# each worker, while "sqlite" keeps it on disk where every worker can see it.
+# The least recently stored entries are evicted once there are too many.
+session_store_backend = get_setting("SESSION_STORE", "memory").lower()
+session_store_path = get_setting("SESSION_STORE_PATH", "/tmp/lingo-sessions.sqlite3")
+session_store_size = get_int_setting("SESSION_STORE_SIZE", 5000)
+session_store_ttl = get_float_setting("SESSION_STORE_TTL", 3600)
+
+# How long (in seconds) a cached word, meaning, or reflection list is used
+# as is, before it is revalidated with the API server again
+response_max_age = get_float_setting("RESPONSE_MAX_AGE", 30)
+
+# When a team becomes current, its word list and the meanings and reflections
+# of its newest words are loaded into the response cache in the background.
+# These set how many threads do that in each worker, how many loads may be
+# waiting before new ones are dropped, and how many words are warmed.
+prefetch_enabled = get_setting("PREFETCH", "on").lower() in ("1", "on", "true", "yes")
+prefetch_workers = get_int_setting("PREFETCH_WORKERS", 2)
+prefetch_queue_size = get_int_setting("PREFETCH_QUEUE_SIZE", 100)
+prefetch_words = get_int_setting("PREFETCH_WORDS", 10)
+
+# Whether request and callback timings are recorded and served at /metrics.
+# Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to an empty directory so the
+# numbers from every worker are added up (bin/run.sh does this).
+metrics_enabled = get_setting("METRICS", "on").lower() in ("1", "on", "true", "yes")
+
+# Exports load the meanings and reflections of this many words at a time,
+# and report their progress after every so many words
+export_workers = get_int_setting("EXPORT_WORKERS", 4)
+export_progress_every = get_int_setting("EXPORT_PROGRESS_EVERY", 25)
+
+# Imports send words, meanings, and reflections on this many threads, at
+# most so many requests a second (0 for no limit), and try a request this
+# many more times when the API server is busy or couldn't be reached
+import_workers = get_int_setting("IMPORT_WORKERS", 16)
+import_rate_limit = get_float_setting("IMPORT_RATE_LIMIT", 200)
+import_retries = get_int_setting("IMPORT_RETRIES", 3)
+import_max_rows = get_int_setting("IMPORT_MAX_ROWS", 5000)
+# An import runs inside a callback, so it stops starting new rows after this
+# many seconds, leaving time to answer before gunicorn's worker timeout
+import_time_limit = get_float_setting("IMPORT_TIME_LIMIT", worker_timeout * 0.8)
+
+# An optional copy of team data kept in a local SQLite file. Lists refreshed
+# within SNAPSHOT_MAX_AGE seconds are read from it without asking the API
+# server. Older lists are asked for again, but if the API server doesn't
+# answer within SNAPSHOT_FALLBACK_TIMEOUT seconds, or fails, the copy is
+# shown instead and marked as stale. A user's token can read a list from
+# the copy for SNAPSHOT_ACCESS_TTL seconds after the API server gave it to them.
+snapshot_enabled = get_setting("SNAPSHOT", "off").lower() in ("1", "on", "true", "yes")
+snapshot_path = get_setting("SNAPSHOT_PATH", "/tmp/lingo-snapshot.sqlite3")
+snapshot_max_age = get_float_setting("SNAPSHOT_MAX_AGE", 60)
+snapshot_fallback_timeout = get_float_setting("SNAPSHOT_FALLBACK_TIMEOUT", 2)
+snapshot_access_ttl = get_float_setting("SNAPSHOT_ACCESS_TTL", 24 * 60 * 60)
+
+# Each endpoint of the API server has a circuit breaker in each worker. Of
+# the last CIRCUIT_WINDOW calls to an endpoint, once at least
+# CIRCUIT_MIN_CALLS have been made and CIRCUIT_FAILURE_RATE of them failed
+# or took longer than CIRCUIT_SLOW_CALL seconds, calls to it are refused for
+# CIRCUIT_OPEN_SECONDS and the last lists it sent are shown instead. Then a
+# single trial call decides whether it is used again.
+circuit_enabled = get_setting("CIRCUIT", "on").lower() in ("1", "on", "true", "yes")
+circuit_window = get_int_setting("CIRCUIT_WINDOW", 20)
+circuit_min_calls = get_int_setting("CIRCUIT_MIN_CALLS", 10)
+circuit_failure_rate = get_float_setting("CIRCUIT_FAILURE_RATE", 0.5)
+circuit_slow_call = get_float_setting("CIRCUIT_SLOW_CALL", 3)
+circuit_open_seconds = get_float_setting("CIRCUIT_OPEN_SECONDS", 30)
@@ -0,0 +1,114 @@
+from config import export_workers, export_progress_every
+from api import fetch_words, fetch_word_details
+import csv
+import io
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+csv_columns = ['record', 'word_id', 'word', 'item_id', 'text', 'created_at', 'status']
+
+
+def _load_word(word, api_token):
+    # The meanings and reflections are loaded side by side, and tried once
+    # more before the word is given up on
+    for _ in range(2):
+        meanings, reflections = fetch_word_details(word['id'], api_token)
+        if meanings is not None and reflections is not None:
+            break
+    return word, meanings, reflections
+
+
+def export_records(api_token, words, start_after=None, word_ids=None):
+    """Yield a record for each word with its meanings and reflections, then a summary.
+
+    Words are exported in order of id. The meanings and reflections of the
+    next few words are loaded while earlier ones are being written, but only
+    export_workers words are ever held at once. A word whose meanings or
+    reflections can't be loaded is written as failed, and the export goes on.
+    The summary lists the failed words, which can be passed back as word_ids
+    to export just those, and the last word written, which can be passed
+    back as start_after to carry on from where an export stopped.
+    """
+    words = sorted(words, key=lambda word: word['id'])
+    if word_ids is not None:
+        words = [word for word in words if word['id'] in word_ids]
+    if start_after is not None:
+        words = [word for word in words if word['id'] > start_after]
+    total = len(words)
+    done = 0
+    failed = []
+    last_word_id = start_after
+    with ThreadPoolExecutor(max_workers=export_workers, thread_name_prefix="lingo-export") as executor:
+        remaining = iter(words)
+        pending = deque()
+        for word in remaining:
+            pending.append(executor.submit(_load_word, word, api_token))
+            if len(pending) >= export_workers:
+                break
+        while pending:
+            word, meanings, reflections = pending.popleft().result()
+            next_word = next(remaining, None)
+            if next_word is not None:
+                pending.append(executor.submit(_load_word, next_word, api_token))
+
+            if meanings is None or reflections is None:
+                failed.append(word['id'])
+                yield {'record': 'word', 'word_id': word['id'], 'word': word['word'],
+                       'created_at': word.get('created_at'), 'status': 'failed'}
+            else:
+                yield {'record': 'word', 'word_id': word['id'], 'word': word['word'],
+                       'created_at': word.get('created_at'), 'status': 'ok',
+                       'meanings': meanings, 'reflections': reflections}
+            done += 1
+            last_word_id = word['id']
+            if done % export_progress_every == 0 and done < total:
+                yield {'record': 'progress', 'done': done, 'total': total}
+
+    yield {'record': 'summary', 'done': done, 'total': total, 'failed': failed, 'last_word_id': last_word_id}
+
+
+def _csv_line(values):
+    line = io.StringIO()
+    csv.writer(line).writerow(values)
+    return line.getvalue()
+
+
+def to_csv(records):
+    # Each meaning and reflection is a row after its word's row. Progress
+    # and the summary are rows too, with their numbers in the text column.
+    yield _csv_line(csv_columns)
+    for record in records:
+        if record['record'] == 'word':
+            yield _csv_line(['word', record['word_id'], record['word'], record['word_id'], record['word'],
+                             record['created_at'], record['status']])
+            for kind, field in (('meanings', 'meaning'), ('reflections', 'reflection')):
+                for item in record.get(kind, []):
+                    yield _csv_line([field, record['word_id'], record['word'], item['id'], item[field],
+                                     item.get('created_at'), 'ok'])
+        else:
+            details = {key: value for key, value in record.items() if key != 'record'}
+            yield _csv_line([record['record'], '', '', '', json.dumps(details), '', ''])
+
+
+def to_jsonl(records):
+    for record in records:
+        yield json.dumps(record) + "\n"
+
+
+formats = {
+    'csv': ('text/csv', to_csv),
+    'jsonl': ('application/x-ndjson', to_jsonl),
+}
+
+
+def export_team(api_token, team_id, export_format, start_after=None, word_ids=None):
+    """Return the content type and a generator of lines for a team's export.
+
+    Returns None if the team's words can't be loaded with this token.
+    """
+    words = fetch_words(api_token, team_id, revalidate=True)
+    if words is None:
+        return None
+    content_type, write = formats[export_format]
+    return content_type, write(export_records(api_token, words, start_after, word_ids))
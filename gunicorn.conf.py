@@ -0,0 +1,31 @@
+# gunicorn reads this file from the directory it is started in. Settings
+# given on the command line take precedence over the ones here. Every name
+# here is read as a setting, so config is imported under another name.
+import logging
+import os
+import config as lingo_config
+
+worker_class = lingo_config.worker_class
+workers = lingo_config.workers
+if worker_class == "gthread":
+    threads = lingo_config.worker_threads
+worker_connections = lingo_config.worker_connections
+timeout = lingo_config.worker_timeout
+
+
+def child_exit(server, worker):
+    # Gauges such as the state of the circuit breakers are only shown for
+    # workers that are still running
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    # The client's own loggers, such as the circuit breakers', write to
+    # gunicorn's error log
+    logger = logging.getLogger("lingo")
+    logger.setLevel(logging.INFO)
+    for handler in server.log.error_log.handlers:
+        logger.addHandler(handler)
+    logger.propagate = False
@@ -0,0 +1,95 @@
+from config import metrics_enabled
+import os
+import re
+import time
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST,
+                               generate_latest, multiprocess, REGISTRY)
+
+# Requests to the API server are labelled by what they ask for rather than
+# by their full path, so the number of series doesn't grow with the ids
+endpoint_patterns = [
+    (re.compile(r"^/api/teams/\d+/words$"), "words"),
+    (re.compile(r"^/api/teams/\d+/users$"), "team-members"),
+    (re.compile(r"^/api/teams/\d+$"), "team"),
+    (re.compile(r"^/api/words/\d+/meanings$"), "meanings"),
+    (re.compile(r"^/api/words/\d+/reflections$"), "reflections"),
+    (re.compile(r"^/api/words$"), "words"),
+    (re.compile(r"^/api/my/teams$"), "teams"),
+    (re.compile(r"^/api/my/userinfo$"), "userinfo"),
+    (re.compile(r"^/api/my/team-membership$"), "team-membership"),
+]
+
+api_request_seconds = Histogram(
+    "lingo_api_request_duration_seconds", "Time taken by requests to the API server",
+    ["endpoint", "method"])
+api_responses = Counter(
+    "lingo_api_responses_total", "Responses from the API server, by status code",
+    ["endpoint", "method", "status"])
+api_response_bytes = Histogram(
+    "lingo_api_response_size_bytes", "Size of response bodies from the API server",
+    ["endpoint", "method"], buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+callback_seconds = Histogram(
+    "lingo_callback_duration_seconds", "Time taken by Dash callbacks run on the server",
+    ["callback"])
+# 0 while an endpoint's circuit is closed, 1 while it is half-open, and 2
+# while it is open. Across workers the highest state of a live worker is shown.
+circuit_state = Gauge(
+    "lingo_api_circuit_state", "State of the circuit breaker for each endpoint of the API server",
+    ["endpoint", "method"], multiprocess_mode="livemax")
+circuit_transitions = Counter(
+    "lingo_api_circuit_transitions_total", "Times the circuit breaker for an endpoint changed state",
+    ["endpoint", "method", "state"])
+short_circuited = Counter(
+    "lingo_api_short_circuited_total", "Requests to the API server refused because their circuit was open",
+    ["endpoint", "method"])
+circuit_state_values = {"closed": 0, "half-open": 1, "open": 2}
+
+
+def endpoint_name(path):
+    for pattern, name in endpoint_patterns:
+        if pattern.match(path):
+            return name
+    return "other"
+
+
+def observe_api_call(method, path, started, response):
+    """Record one request to the API server. response is None if it failed."""
+    if not metrics_enabled:
+        return
+    endpoint = endpoint_name(path)
+    api_request_seconds.labels(endpoint, method).observe(time.perf_counter() - started)
+    status = str(response.status_code) if response is not None else "error"
+    api_responses.labels(endpoint, method, status).inc()
+    if response is not None:
+        api_response_bytes.labels(endpoint, method).observe(len(response.content))
+
+
+def observe_callback(callback_name, started):
+    if metrics_enabled:
+        callback_seconds.labels(callback_name).observe(time.perf_counter() - started)
+
+
+def observe_circuit_state(endpoint, method, state):
+    if metrics_enabled:
+        circuit_state.labels(endpoint, method).set(circuit_state_values[state])
+        circuit_transitions.labels(endpoint, method, state).inc()
+
+
+def observe_short_circuit(endpoint, method):
+    if metrics_enabled:
+        short_circuited.labels(endpoint, method).inc()
+
+
+def render_metrics():
+    """Return the body and content type of a /metrics response.
+
+    Under gunicorn, PROMETHEUS_MULTIPROC_DIR should point to an empty
+    directory shared by the workers. Each worker then writes its samples
+    there, and whichever worker answers adds up the samples of all of them.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,91 @@
+from config import prefetch_enabled, prefetch_workers, prefetch_queue_size, prefetch_words
+from api import fetch_words, fetch_meanings, fetch_reflections, token_scope
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("lingo.prefetch")
+
+# Each worker warms the response cache on its own small pool. At most
+# prefetch_queue_size loads may be queued or running at once; past that, new
+# loads are dropped rather than queued, since they are only an optimization.
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(prefetch_queue_size)
+
+# Every time a user's team changes, their generation goes up. Loads queued
+# for an older generation are skipped, so switching teams again cancels
+# whatever was still waiting for the previous team. Only the most recent
+# users are remembered.
+max_generations = 10000
+_generations = OrderedDict()
+_generations_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix="lingo-prefetch")
+                _executor_pid = pid
+    return _executor
+
+
+def _is_current(scope, generation):
+    with _generations_lock:
+        return _generations.get(scope) == generation
+
+
+def _submit(scope, generation, fn, *args):
+    if not _slots.acquire(blocking=False):
+        # This happens a lot under load, so it is only logged when debugging
+        logger.debug("Prefetch queue is full, skipping %s", fn.__name__)
+        return False
+
+    def run():
+        try:
+            if _is_current(scope, generation):
+                fn(*args)
+        except Exception as e:
+            logger.warning("Prefetch with %s failed: %s", fn.__name__, e)
+        finally:
+            _slots.release()
+
+    _get_executor().submit(run)
+    return True
+
+
+def _warm_words(api_token, team_id, scope, generation):
+    words = fetch_words(api_token, team_id)
+    if not words:
+        return
+    # The newest words are the ones most likely to be looked at next
+    newest = sorted(words, key=lambda word: word.get('created_at') or '', reverse=True)[:prefetch_words]
+    for word in newest:
+        if not _submit(scope, generation, fetch_meanings, word['id'], api_token):
+            return
+        if not _submit(scope, generation, fetch_reflections, word['id'], api_token):
+            return
+
+
+def warm_team(api_token, team_id):
+    """Start loading a team's data into the response cache in the background.
+
+    Returns straight away. Anything still waiting to be loaded for the
+    same user's previous team is cancelled.
+    """
+    if not prefetch_enabled or not api_token or team_id is None or team_id == -1:
+        return
+    scope = token_scope(api_token)
+    with _generations_lock:
+        generation = _generations.get(scope, 0) + 1
+        _generations[scope] = generation
+        _generations.move_to_end(scope)
+        while len(_generations) > max_generations:
+            _generations.popitem(last=False)
+    _submit(scope, generation, _warm_words, api_token, team_id, scope, generation)
@@ -0,0 +1,269 @@
+from config import search_index_max_teams, search_index_refresh, search_index_workers
+from api import fetch_words, fetch_word_details, token_scope
+import bisect
+import heapq
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# How much a match of each kind of item, and each kind of match, counts
+# towards a result's score. Words come first, then meanings, then reflections.
+kind_weights = {'word': 3, 'meaning': 2, 'reflection': 1}
+exact_match, prefix_match, substring_match = 3, 2, 1
+
+
+def tokenize(text):
+    return re.findall(r"\w+", (text or "").casefold())
+
+
+def trigrams(term):
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+class SearchIndex:
+    """An in-memory index of one team's words, meanings, and reflections.
+
+    Each term maps to the items it appears in. The sorted list of terms
+    answers prefix queries with a binary search, and a trigram index over
+    the terms answers substring queries, so a lookup only ever touches the
+    terms that can match rather than every item.
+    """
+
+    def __init__(self):
+        self.items = {}
+        self.postings = {}
+        self.terms = []
+        self.term_trigrams = {}
+        self.word_labels = {}
+        self.loaded_word_ids = set()
+        self.loading_word_ids = set()
+        self.authorized_scopes = set()
+        self.synced_at = 0
+        self.details_synced_at = None
+        self.lock = threading.RLock()
+
+    def add(self, kind, item_id, text, word_id):
+        key = (kind, item_id)
+        with self.lock:
+            if key in self.items:
+                return
+            self.items[key] = {'kind': kind, 'id': item_id, 'text': text, 'word_id': word_id}
+            if kind == 'word':
+                self.word_labels[word_id] = text
+            for term in set(tokenize(text)):
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = set()
+                    bisect.insort(self.terms, term)
+                    for trigram in trigrams(term):
+                        self.term_trigrams.setdefault(trigram, set()).add(term)
+                postings.add(key)
+
+    def add_word(self, word):
+        self.add('word', word['id'], word['word'], word['id'])
+
+    def add_meaning(self, word_id, meaning):
+        self.add('meaning', meaning['id'], meaning['meaning'], word_id)
+
+    def add_reflection(self, word_id, reflection):
+        self.add('reflection', reflection['id'], reflection['reflection'], word_id)
+
+    def matching_terms(self, query_term):
+        # Returns how well each indexed term matches one term of a query
+        matches = {}
+        start = bisect.bisect_left(self.terms, query_term)
+        for term in self.terms[start:]:
+            if not term.startswith(query_term):
+                break
+            matches[term] = exact_match if term == query_term else prefix_match
+        if len(query_term) >= 3:
+            candidates = None
+            for trigram in trigrams(query_term):
+                terms = self.term_trigrams.get(trigram, set())
+                candidates = terms if candidates is None else candidates & terms
+            for term in candidates or ():
+                if term not in matches and query_term in term:
+                    matches[term] = substring_match
+        return matches
+
+    def search(self, query, limit=10, kinds=None):
+        query_terms = tokenize(query)
+        if not query_terms:
+            return []
+        with self.lock:
+            scores = None
+            for query_term in query_terms:
+                term_scores = {}
+                for term, quality in self.matching_terms(query_term).items():
+                    for key in self.postings[term]:
+                        if kinds is None or key[0] in kinds:
+                            term_scores[key] = max(term_scores.get(key, 0), quality)
+                # Every term of the query has to match somewhere in an item
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {key: scores[key] + score for key, score in term_scores.items() if key in scores}
+                if not scores:
+                    return []
+            ranked = sorted(scores, key=lambda key: (-scores[key] * kind_weights[key[0]],
+                                                     self.items[key]['text'].casefold()))
+            results = []
+            for key in ranked[:limit]:
+                item = dict(self.items[key])
+                item['word'] = self.word_labels.get(item['word_id'], '')
+                results.append(item)
+            return results
+
+    def first_words(self, limit):
+        # The first words in alphabetical order, as (id, word) pairs
+        with self.lock:
+            return heapq.nsmallest(limit, self.word_labels.items(), key=lambda w: w[1].casefold())
+
+
+# Indexes are kept per team, with the least recently searched team dropped
+# first once there are too many. Meanings and reflections are loaded in the
+# background on a small pool, so the first search doesn't wait for them.
+_team_indexes = OrderedDict()
+_team_indexes_lock = threading.Lock()
+_loader = ThreadPoolExecutor(max_workers=search_index_workers, thread_name_prefix="lingo-search")
+
+
+def _get_index(team_id):
+    with _team_indexes_lock:
+        index = _team_indexes.get(team_id)
+        if index is None:
+            index = _team_indexes[team_id] = SearchIndex()
+            while len(_team_indexes) > search_index_max_teams:
+                _team_indexes.popitem(last=False)
+        _team_indexes.move_to_end(team_id)
+        return index
+
+
+def _add_word_details(index, word_id, meanings, reflections):
+    for meaning in meanings or []:
+        index.add_meaning(word_id, meaning)
+    for reflection in reflections or []:
+        index.add_reflection(word_id, reflection)
+
+
+def _load_word_details(index, word_id, api_token):
+    # A word whose details fail to load is tried again at the next refresh
+    meanings, reflections = None, None
+    try:
+        meanings, reflections = fetch_word_details(word_id, api_token)
+        _add_word_details(index, word_id, meanings, reflections)
+    finally:
+        with index.lock:
+            index.loading_word_ids.discard(word_id)
+            if meanings is not None and reflections is not None:
+                index.loaded_word_ids.add(word_id)
+
+
+def team_index(api_token, team_id, details=True):
+    """Return the search index for a team, or None if this user can't read it.
+
+    The meanings and reflections of the team's words are only loaded into
+    the index once it is asked for with details, as word lookups alone
+    don't need them.
+    """
+    if not api_token or team_id is None or team_id == -1:
+        return None
+    index = _get_index(team_id)
+    scope = token_scope(api_token)
+    with index.lock:
+        is_current = scope in index.authorized_scopes and time.monotonic() - index.synced_at < search_index_refresh
+        details_current = not details or index.details_synced_at == index.synced_at
+    if is_current and details_current:
+        return index
+
+    # Bring the word list up to date. This is also what tells us that the
+    # user is allowed to see this team at all.
+    words = fetch_words(api_token, team_id)
+    if words is None:
+        with index.lock:
+            index.authorized_scopes.discard(scope)
+        return None
+    # Meanings and reflections are only loaded for words the index hasn't
+    # seen before. Ones added to known words later reach the index through
+    # the submit and sync callbacks.
+    with index.lock:
+        index.authorized_scopes.add(scope)
+        if not is_current:
+            index.synced_at = time.monotonic()
+        word_ids = []
+        for word in words:
+            index.add_word(word)
+            if (details and word['id'] not in index.loaded_word_ids
+                    and word['id'] not in index.loading_word_ids):
+                index.loading_word_ids.add(word['id'])
+                word_ids.append(word['id'])
+        if details:
+            index.details_synced_at = index.synced_at
+    for word_id in word_ids:
+        _loader.submit(_load_word_details, index, word_id, api_token)
+    return index
+
+
+def search_team(api_token, team_id, query, limit=10):
+    index = team_index(api_token, team_id)
+    if index is None:
+        return []
+    return index.search(query, limit)
+
+
+def search_word_options(api_token, team_id, query, limit=20):
+    """Return the best matching words for a query as (id, word) pairs."""
+    index = team_index(api_token, team_id, details=False)
+    if index is None:
+        return []
+    if query is None or len(query.strip()) == 0:
+        return index.first_words(limit)
+    return [(result['id'], result['text']) for result in index.search(query, limit, kinds=('word',))]
+
+
+def word_label(api_token, team_id, word_id):
+    index = team_index(api_token, team_id, details=False)
+    if index is None:
+        return None
+    with index.lock:
+        return index.word_labels.get(word_id)
+
+
+# These keep the index of a team in step with items added through this
+# worker, or found by its sync callbacks, between refreshes
+def index_word(team_id, word):
+    with _team_indexes_lock:
+        index = _team_indexes.get(team_id)
+    if index is not None:
+        index.add_word(word)
+
+
+def index_words(team_id, words):
+    with _team_indexes_lock:
+        index = _team_indexes.get(team_id)
+    if index is not None:
+        for word in words:
+            index.add_word(word)
+
+
+def index_word_details(team_id, word_id, meanings, reflections):
+    with _team_indexes_lock:
+        index = _team_indexes.get(team_id)
+    if index is not None:
+        _add_word_details(index, word_id, meanings, reflections)
+
+
+def index_meaning(team_id, word_id, meaning):
+    with _team_indexes_lock:
+        index = _team_indexes.get(team_id)
+    if index is not None:
+        index.add_meaning(word_id, meaning)
+
+
+def index_reflection(team_id, word_id, reflection):
+    with _team_indexes_lock:
+        index = _team_indexes.get(team_id)
+    if index is not None:
+        index.add_reflection(word_id, reflection)
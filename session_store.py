@@ -0,0 +1,71 @@
+from config import session_store_backend, session_store_path, session_store_size, session_store_ttl
+from cache import create_cache
+from api import fetch_words, fetch_word_details, token_scope
+
+# Team data already fetched for a browser session, keyed by the session's ID
+# and the user's token scope. Pages keep only the session ID in the browser;
+# a session ID on its own, without the matching token, finds nothing.
+_store = create_cache("sessions", session_store_size, session_store_ttl,
+                      backend=session_store_backend, path=session_store_path)
+
+
+def _key(session_id, api_token, name):
+    return f"{session_id}|{token_scope(api_token)}|{name}"
+
+
+def get_session_data(session_id, api_token, name):
+    if not session_id or not api_token:
+        return None
+    return _store.get(_key(session_id, api_token, name))
+
+
+def set_session_data(session_id, api_token, name, value):
+    if session_id and api_token and value is not None:
+        _store.set(_key(session_id, api_token, name), value)
+
+
+def load_team_words(session_id, api_token, team_id, refresh=False):
+    """Return a team's words, fetching them only if this session doesn't have them."""
+    name = f"words:{team_id}"
+    words = None if refresh else get_session_data(session_id, api_token, name)
+    if words is None:
+        words = fetch_words(api_token, team_id, revalidate=refresh)
+        set_session_data(session_id, api_token, name, words)
+    return words
+
+
+def load_word_details(session_id, api_token, word_id, refresh=False):
+    """Return a word's meanings and reflections, fetching only what this session doesn't have."""
+    meanings_name = f"meanings:{word_id}"
+    reflections_name = f"reflections:{word_id}"
+    meanings = None if refresh else get_session_data(session_id, api_token, meanings_name)
+    reflections = None if refresh else get_session_data(session_id, api_token, reflections_name)
+    if meanings is None or reflections is None:
+        meanings, reflections = fetch_word_details(word_id, api_token, revalidate=refresh)
+        set_session_data(session_id, api_token, meanings_name, meanings)
+        set_session_data(session_id, api_token, reflections_name, reflections)
+    return meanings, reflections
+
+
+def append_session_item(session_id, api_token, name, item):
+    # Adds an item this session just created to a list it already has, so the
+    # list doesn't have to be fetched again to include it
+    items = get_session_data(session_id, api_token, name)
+    if items is not None:
+        set_session_data(session_id, api_token, name, items + [item])
+
+
+def merge_session_items(session_id, api_token, name, items, new_items):
+    """Add items found by another worker to a list, unless it already has them.
+
+    Returns the list with the items added. With the memory backend each
+    worker has its own session data, so a redraw may land on a worker that
+    hasn't seen items another worker just added.
+    """
+    known = {item['id'] for item in items}
+    missing = [item for item in new_items if item.get('id') not in known]
+    if not missing:
+        return items
+    items = items + missing
+    set_session_data(session_id, api_token, name, items)
+    return items
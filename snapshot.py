@@ -0,0 +1,103 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class SnapshotStore:
+    """A local copy of team data kept in SQLite, shared by every worker on a host.
+
+    Each list the API server sends (a team's words or users, a word's
+    meanings or reflections) is kept one row per item, under the path it
+    came from. Lists are refreshed incrementally: only items created after
+    the newest one already stored are written. A list is only read back for
+    users whose token the API server has already given it to.
+    """
+
+    # Old grants of access are only cleared out every few writes
+    prune_interval = 100
+
+    def __init__(self, path, access_ttl):
+        self.path = path
+        self.access_ttl = access_ttl
+        self._local = threading.local()
+        self._writes = 0
+        connection = self._connect()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS snapshot_lists ("
+            "path TEXT PRIMARY KEY, refreshed_at REAL NOT NULL, newest TEXT, expired INTEGER NOT NULL DEFAULT 0)")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS snapshot_items ("
+            "path TEXT NOT NULL, position INTEGER NOT NULL, created_at TEXT, data TEXT NOT NULL, "
+            "PRIMARY KEY (path, position))")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS snapshot_access ("
+            "path TEXT NOT NULL, scope TEXT NOT NULL, granted_at REAL NOT NULL, PRIMARY KEY (path, scope))")
+
+    def _connect(self):
+        # As with SqliteCache, each thread of each worker has its own connection
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def read(self, path, scope):
+        """Return (items, refreshed_at, expired) for a list, or None if this scope can't have it."""
+        connection = self._connect()
+        row = connection.execute(
+            "SELECT l.refreshed_at, l.expired FROM snapshot_lists l JOIN snapshot_access a ON a.path = l.path "
+            "WHERE l.path = ? AND a.scope = ? AND a.granted_at > ?",
+            (path, scope, time.time() - self.access_ttl)).fetchone()
+        if row is None:
+            return None
+        items = [json.loads(data) for (data,) in connection.execute(
+            "SELECT data FROM snapshot_items WHERE path = ? ORDER BY position", (path,))]
+        return items, row[0], bool(row[1])
+
+    def store(self, path, scope, items):
+        now = time.time()
+        stamps = [item.get('created_at') for item in items if isinstance(item, dict)]
+        newest = max((stamp for stamp in stamps if stamp), default=None)
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT newest FROM snapshot_lists WHERE path = ?", (path,)).fetchone()
+            count = connection.execute("SELECT COUNT(*) FROM snapshot_items WHERE path = ?", (path,)).fetchone()[0]
+            stored_newest = row[0] if row is not None else None
+            # Items are only ever added, so when the list is what we have
+            # followed by items created since, only those need writing
+            if (stored_newest is not None and None not in stamps and len(items) >= count
+                    and all(stamp <= stored_newest for stamp in stamps[:count])
+                    and all(stamp > stored_newest for stamp in stamps[count:])):
+                new_items = list(enumerate(items))[count:]
+            else:
+                connection.execute("DELETE FROM snapshot_items WHERE path = ?", (path,))
+                new_items = list(enumerate(items))
+            connection.executemany(
+                "INSERT OR REPLACE INTO snapshot_items (path, position, created_at, data) VALUES (?, ?, ?, ?)",
+                [(path, position, item.get('created_at') if isinstance(item, dict) else None,
+                  json.dumps(item)) for position, item in new_items])
+            connection.execute(
+                "INSERT OR REPLACE INTO snapshot_lists (path, refreshed_at, newest, expired) "
+                "VALUES (?, ?, ?, 0)", (path, now, newest))
+            connection.execute("INSERT OR REPLACE INTO snapshot_access (path, scope, granted_at) VALUES (?, ?, ?)",
+                               (path, scope, now))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        self._writes += 1
+        if self._writes % self.prune_interval == 0:
+            connection.execute("DELETE FROM snapshot_access WHERE granted_at < ?", (now - self.access_ttl,))
+
+    def revoke(self, path, scope):
+        self._connect().execute("DELETE FROM snapshot_access WHERE path = ? AND scope = ?", (path, scope))
+
+    def forget(self, path):
+        # Used when this client adds to a list, so the next read refreshes it
+        self._connect().execute("UPDATE snapshot_lists SET expired = 1 WHERE path = ?", (path,))
@@ -0,0 +1,59 @@
+"""Check that word lists are revalidated with If-None-Match and 304s are honoured."""
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import api
+from benchmarks.fake_api import Dataset, FakeApiHandler
+from benchmarks.token_stub import make_token
+
+
+class RecordingHandler(FakeApiHandler):
+    # Remembers the validator each request carried and the status it got
+    def send_response(self, code, message=None):
+        self.server.requests.append((self.path, self.headers.get("If-None-Match"), code))
+        super().send_response(code, message)
+
+
+@pytest.fixture
+def api_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RecordingHandler)
+    server.daemon_threads = True
+    server.latency = 0.0
+    server.jitter = 0.0
+    server.dataset = Dataset(teams=1, words_per_team=3, items_per_word=1)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(api, "api_server_url", f"http://127.0.0.1:{server.server_address[1]}")
+    api._validation_cache.clear()
+    yield server
+    server.shutdown()
+    server.server_close()
+    api._get_session().close()
+
+
+def test_second_fetch_sends_etag_and_reuses_cached_words(api_server):
+    token = make_token(1)
+
+    first = api.fetch_words(token, 1, revalidate=True)
+    second = api.fetch_words(token, 1, revalidate=True)
+
+    assert [word['word'] for word in first] == ["word 1-0", "word 1-1", "word 1-2"]
+    (first_path, first_etag, first_status), (second_path, second_etag, second_status) = api_server.requests
+    assert first_path == second_path == "/api/teams/1/words"
+    assert first_etag is None and first_status == 200
+    assert second_etag is not None and second_status == 304
+    assert second is first
+
+
+def test_changed_list_is_fetched_again(api_server):
+    token = make_token(1)
+
+    first = api.fetch_words(token, 1, revalidate=True)
+    with api_server.dataset.lock:
+        api_server.dataset.add_word(1, "a new word")
+    second = api.fetch_words(token, 1, revalidate=True)
+
+    assert api_server.requests[1][2] == 200
+    assert len(second) == len(first) + 1